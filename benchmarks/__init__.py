@@ -0,0 +1,9 @@
+import os
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ecommerce_api.settings")
+
+    import django
+
+    django.setup()
@@ -0,0 +1,73 @@
+"""
+Parse + validate cost of a storefront query, with and without the
+document cache.
+
+usage: python -m benchmarks.documents [iterations]
+"""
+import sys
+import time
+
+from . import setup_django
+
+QUERY = """
+query Storefront($search: String, $categoryId: ID, $after: String) {
+  categories { id name productCount parent { id name } }
+  products(search: $search, categoryId: $categoryId, pageSize: 24, after: $after) {
+    after hasNext
+    facets {
+      categories { id name count }
+      businesses { id name count }
+      prices { min max count }
+    }
+    results {
+      ...ProductCard
+      comments(first: 3) { results { id comment rate createdAt user { firstName } } }
+    }
+  }
+}
+
+fragment ProductCard on ProductType {
+  id name price available ratingAvg ratingCount createdAt
+  category { id name }
+  business { id name }
+  productImages { id image { id } }
+}
+"""
+
+
+def run(iterations: int = 2000) -> dict:
+    from graphql.backend.core import GraphQLCoreBackend
+    from graphql.validation import validate
+    from ecommerce_api.documents import CachedDocumentBackend
+    from ecommerce_api.schema import schema
+
+    def uncached():
+        document = GraphQLCoreBackend().document_from_string(schema, QUERY)
+        # the core backend validates at execution time
+        assert not validate(schema, document.document_ast)
+
+    backend = CachedDocumentBackend()
+
+    def cached():
+        backend.document_from_string(schema, QUERY)
+
+    timings = {}
+    for name, fn in (("uncached", uncached), ("cached", cached)):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        timings[name] = (time.perf_counter() - started) / iterations
+
+    return {
+        "iterations": iterations,
+        "query_bytes": len(QUERY),
+        "uncached_ms": round(timings["uncached"] * 1000, 3),
+        "cached_ms": round(timings["cached"] * 1000, 4),
+        "speedup": round(timings["uncached"] / timings["cached"]),
+        "cache": backend.stats(),
+    }
+
+
+if __name__ == "__main__":
+    setup_django()
+    print(run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,153 @@
+"""
+EXPLAIN ANALYZE harness for the hot ORM queries.
+
+usage: python -m benchmarks.explain [--seed N] [--output plans.json] [--baseline plans.json]
+
+Needs postgres. Each query is built through the same service code the API
+uses, sliced like a page, and explained with ANALYZE. The report lists
+scan nodes, indexes used and timings per query; with `--baseline` it
+prints the queries whose plan shape changed and exits non-zero if any
+index that used to serve a query is no longer used.
+"""
+import argparse
+import json
+import sys
+
+from . import setup_django
+
+PAGE = 21
+
+
+def hot_queries() -> dict:
+    from products.models import Business, Cart, Category, Product
+    from products.services import order_service, product_service
+    from users.models import User
+
+    category = Category.objects.order_by("id").values_list("name", flat=True).first()
+    small_category = Category.objects.order_by("-id").values_list("name", flat=True).first()
+    business = Business.objects.order_by("id").first()
+    small_business = Business.objects.order_by("-id").first()
+    buyer = User.objects.filter(user_carts__isnull=False).order_by("id").first()
+
+    return {
+        "products_default": product_service.get_products()[:PAGE],
+        "products_deep_keyset": product_service.get_products().filter(
+            created_at__lte=Product.objects.order_by("created_at")
+            .values_list("created_at", flat=True)[1000]
+        )[:PAGE],
+        "products_price_range": product_service.get_products(min_price=10, max_price=50)[:PAGE],
+        "products_sort_price": product_service.get_products(sort_by="price", is_asc=True)[:PAGE],
+        "products_sort_rating": product_service.get_products(sort_by="rating")[:PAGE],
+        "products_price_range_sort_price": product_service.get_products(
+            min_price=10, max_price=50, sort_by="price", is_asc=True
+        )[:PAGE],
+        "products_category": product_service.get_products(category=category)[:PAGE],
+        "products_small_category": product_service.get_products(category=small_category)[
+            :PAGE
+        ],
+        "products_business": product_service.get_products(business=business.name)[:PAGE],
+        "products_small_business": product_service.get_products(
+            business=small_business.name
+        )[:PAGE],
+        "products_small_business_id": Product.objects.filter(business_id=small_business.id)[
+            :PAGE
+        ],
+        "comments_by_product": product_service.get_comments().filter(
+            product_id=Product.objects.order_by("id").values_list("id", flat=True).first()
+        )[:PAGE],
+        "cart_by_user": Cart.objects.filter(user_id=buyer.id)[:PAGE],
+        "orders_by_user": order_service.get_user_orders(buyer)[:PAGE],
+        "orders_by_business": order_service.get_business_orders(business.user)[:PAGE],
+        "orders_by_small_business": order_service.get_business_orders(
+            small_business.user
+        )[:PAGE],
+    }
+
+
+def walk(node, nodes):
+    nodes.append(
+        {
+            "type": node["Node Type"],
+            "relation": node.get("Relation Name"),
+            "index": node.get("Index Name"),
+        }
+    )
+    for child in node.get("Plans", []):
+        walk(child, nodes)
+    return nodes
+
+
+def explain(qs) -> dict:
+    from django.db import connections
+
+    sql, params = qs.query.sql_with_params()
+    with connections[qs.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0][0]
+    nodes = walk(plan["Plan"], [])
+    return {
+        "execution_ms": plan["Execution Time"],
+        "planning_ms": plan["Planning Time"],
+        "shape": [f'{n["type"]}:{n["index"] or n["relation"] or ""}' for n in nodes],
+        "indexes": sorted({n["index"] for n in nodes if n["index"]}),
+        "seq_scans": sorted({n["relation"] for n in nodes if n["type"] == "Seq Scan"}),
+    }
+
+
+def compare(report: dict, baseline: dict) -> list:
+    regressions = []
+    for name, current in report.items():
+        previous = baseline.get(name)
+        if previous is None or previous["shape"] == current["shape"]:
+            continue
+        lost = sorted(set(previous["indexes"]) - set(current["indexes"]))
+        gained = sorted(set(current["indexes"]) - set(previous["indexes"]))
+        scans = sorted(set(current["seq_scans"]) - set(previous["seq_scans"]))
+        print(f"plan changed: {name}")
+        print(f'  before: {" > ".join(previous["shape"])} ({previous["execution_ms"]} ms)')
+        print(f'  after:  {" > ".join(current["shape"])} ({current["execution_ms"]} ms)')
+        # trading one index for another is fine, falling back to a scan is not
+        if (lost and not gained) or scans:
+            regressions.append(name)
+            print(f'  REGRESSION, lost: {", ".join(lost) or "-"} new seq scans: {", ".join(scans) or "-"}')
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, help="seed N products before explaining")
+    parser.add_argument("--output", help="write the report as json")
+    parser.add_argument("--baseline", help="report to compare plans against")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+
+    if connection.vendor != "postgresql":
+        print("the explain harness needs postgres", file=sys.stderr)
+        return 2
+
+    if args.seed:
+        from .seed import seed_activity, seed_catalog
+
+        print(seed_catalog(products=args.seed))
+        print(seed_activity(carts=args.seed // 10, orders=args.seed // 4))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    report = {name: explain(qs) for name, qs in hot_queries().items()}
+    for name, result in report.items():
+        print(f'{name:34} {result["execution_ms"]:>10.3f} ms  {" > ".join(result["shape"])}')
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            return 1 if compare(report, json.load(f)) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+OFFSET vs keyset page latency at increasing depth.
+
+usage: python -m benchmarks.keyset_pagination [products] [--seed]
+
+Run against a local Postgres; `--seed` fills the catalog first (1M products
+by default). Each depth is timed as the median of several fetches.
+"""
+import statistics
+import sys
+import time
+
+from . import setup_django
+
+PAGE_SIZE = 20
+DEPTHS = (1, 10, 100, 1000, 5000, 20000, 45000)
+
+
+def timed(fn, repeat=5) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def run(sort_by=None) -> list:
+    from ecommerce_api.pagination import encode_cursor, get_ordering_keys, keyset_page
+    from products.models import Product
+
+    qs = Product.objects.all()
+    if sort_by:
+        qs = qs.order_by(sort_by)
+    keys = get_ordering_keys(qs)
+    qs = qs.order_by(*[f"-{name}" if desc else name for name, desc in keys])
+    total = qs.count()
+
+    report = []
+    for depth in DEPTHS:
+        offset = (depth - 1) * PAGE_SIZE
+        if offset >= total:
+            break
+        cursor = encode_cursor(qs[offset - 1], qs, keys) if offset else None
+
+        report.append(
+            {
+                "page": depth,
+                "offset_ms": timed(lambda: list(qs[offset : offset + PAGE_SIZE + 1])),
+                "keyset_ms": timed(lambda: keyset_page(qs, cursor, PAGE_SIZE))
+                if cursor
+                else None,
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    setup_django()
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if "--seed" in sys.argv:
+        from .seed import seed_catalog
+
+        print(seed_catalog(products=int(args[0]) if args else 1000000))
+    for sort_by in (None, "price", "-name"):
+        print(sort_by or "-created_at", run(sort_by))
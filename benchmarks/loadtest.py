@@ -0,0 +1,425 @@
+"""
+Replay a storefront mix of GraphQL operations and report latency,
+queries per request and memory.
+
+usage: python -m benchmarks.loadtest [--seed] [--products N ...] [--requests N]
+           [--mix products=55,product=25,me=10,createCart=7,completePayment=3]
+           [--transport client|wsgi] [--output run.json] [--baseline run.json]
+
+Works on postgres or sqlite, whatever DJANGO_SETTINGS_MODULE points at.
+`--seed` fills the database first through benchmarks.seed, the volumes
+are flags. Requests go through the django test client, or with
+`--transport wsgi` over HTTP to a wsgiref server started in this process.
+Requests are sent one at a time and the operation sequence comes from
+`--random-seed`, so two runs over the same data replay the same requests.
+createCart and completePayment write, rerun against a fresh seed to compare
+runs exactly.
+
+The report is json: per operation count, errors, p50/p95/p99/mean latency
+and queries per request, plus throughput and RSS. With `--baseline` the
+operations whose p95 or queries per request grew past `--tolerance` are
+listed and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from . import setup_django
+
+DEFAULT_MIX = "products=55,product=25,me=10,createCart=7,completePayment=3"
+
+PRODUCTS_QUERY = """
+query Products($search: String, $categoryId: ID, $sortBy: String, $isAsc: Boolean,
+               $pageSize: Int, $after: String) {
+  products(search: $search, categoryId: $categoryId, sortBy: $sortBy, isAsc: $isAsc,
+           pageSize: $pageSize, after: $after) {
+    hasNext after
+    results { id name price available ratingAvg category { id name } business { id name } }
+  }
+}
+"""
+
+PRODUCTS_FACETS_QUERY = """
+query ProductsFacets($categoryId: ID) {
+  products(categoryId: $categoryId, pageSize: 24) {
+    results { id name price }
+    facets { categories { id name count } prices { min max count } }
+  }
+}
+"""
+
+PRODUCT_QUERY = """
+query Product($id: ID!) {
+  product(id: $id) {
+    id name description price available ratingAvg ratingCount
+    category { id name }
+    business { id name }
+    productImages { id }
+    comments(first: 5) { hasNext results { id comment rate createdAt } }
+  }
+}
+"""
+
+ME_QUERY = "query Me { me { id email firstName lastName } }"
+
+CREATE_CART_MUTATION = """
+mutation CreateCart($productId: ID!, $quantity: Int) {
+  createCart(productId: $productId, quantity: $quantity) { cart { id quantity } }
+}
+"""
+
+COMPLETE_PAYMENT_MUTATION = "mutation CompletePayment { completePayment { status } }"
+
+SEARCH_WORDS = ["phone", "book", "lamp", "red case", "blue", "mini pro"]
+SORTS = [(None, None), ("price", True), ("price", False), ("rating", False), ("created_at", True)]
+
+
+class Workload(object):
+    """Builds the requests of each operation from the seeded data."""
+
+    def __init__(self, rnd: random.Random, buyers: int = 200):
+        from ecommerce_api.auth import TokenManager
+        from products.models import Category, Product
+        from users.models import User
+
+        self.rnd = rnd
+        bounds = Product.objects.order_by("pk").values_list("pk", flat=True)
+        self.first_product = bounds.first()
+        self.last_product = bounds.last()
+        self.category_ids = list(Category.objects.values_list("pk", flat=True))
+        buyer_ids = list(
+            User.objects.filter(email__startswith="buyer", email__endswith="@bench.local")
+            .order_by("pk")
+            .values_list("pk", flat=True)[:buyers]
+        )
+        if self.first_product is None or not buyer_ids:
+            raise SystemExit("no benchmark data, run with --seed first")
+        self.tokens = [TokenManager.get_access({"user_id": pk}) for pk in buyer_ids]
+
+    def product_id(self) -> int:
+        return self.rnd.randint(self.first_product, self.last_product)
+
+    def token(self) -> str:
+        return self.rnd.choice(self.tokens)
+
+    def build(self, operation: str) -> tuple:
+        """`(query, variables, token)` of one request."""
+        return getattr(self, f"_{operation}")()
+
+    def _products(self):
+        rnd = self.rnd
+        if rnd.random() < 0.15:
+            return PRODUCTS_FACETS_QUERY, {"categoryId": rnd.choice(self.category_ids)}, None
+
+        sort_by, is_asc = rnd.choice(SORTS)
+        variables = {"pageSize": rnd.choice((12, 24, 48)), "sortBy": sort_by, "isAsc": is_asc}
+        if rnd.random() < 0.3:
+            variables["categoryId"] = rnd.choice(self.category_ids)
+        if rnd.random() < 0.2:
+            variables["search"] = rnd.choice(SEARCH_WORDS)
+            variables["sortBy"] = "relevance"
+        return PRODUCTS_QUERY, variables, None
+
+    def _product(self):
+        return PRODUCT_QUERY, {"id": self.product_id()}, None
+
+    def _me(self):
+        return ME_QUERY, {}, self.token()
+
+    def _createCart(self):
+        variables = {"productId": self.product_id(), "quantity": self.rnd.randint(1, 2)}
+        return CREATE_CART_MUTATION, variables, self.token()
+
+    def _completePayment(self):
+        return COMPLETE_PAYMENT_MUTATION, {}, self.token()
+
+
+class QueryCounter(object):
+    """connection.execute_wrapper counting the queries of the running thread."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ClientTransport(object):
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client()
+
+    def post(self, body: dict, token=None) -> tuple:
+        from django.db import connection
+
+        headers = {"HTTP_AUTHORIZATION": f"JWT {token}"} if token else {}
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.client.post(
+                "/graphview/", json.dumps(body), content_type="application/json", **headers
+            )
+        return response.status_code, response.content, counter.count
+
+
+class WSGITransport(object):
+    """HTTP to a wsgiref server in a thread of this process."""
+
+    def __init__(self):
+        from wsgiref.simple_server import WSGIRequestHandler, make_server
+        from django.core.wsgi import get_wsgi_application
+
+        application = get_wsgi_application()
+
+        def counted(environ, start_response):
+            # runs in the server thread, whose connection serves the request;
+            # the count is final once the body is built, headers go out after
+            from django.db import connection
+
+            counter, captured = QueryCounter(), []
+
+            def capture(status, headers, exc_info=None):
+                captured[:] = [status, headers, exc_info]
+                return lambda data: None
+
+            with connection.execute_wrapper(counter):
+                response = application(environ, capture)
+                body = b"".join(response)
+                response.close()
+            status, headers, exc_info = captured
+            start_response(status, headers + [("X-Query-Count", str(counter.count))], exc_info)
+            return [body]
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.server = make_server("127.0.0.1", 0, counted, handler_class=QuietHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/graphview/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def post(self, body: dict, token=None) -> tuple:
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"JWT {token}"
+        request = urllib.request.Request(self.url, json.dumps(body).encode(), headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, content = response.status, response.read()
+                queries = response.headers.get("X-Query-Count")
+        except urllib.error.HTTPError as e:
+            status, content, queries = e.code, e.read(), e.headers.get("X-Query-Count")
+        return status, content, int(queries or 0)
+
+    def close(self):
+        self.server.shutdown()
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(Workload, f"_{name.strip()}"):
+            raise SystemExit(f"unknown operation {name}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(samples: list, p: float) -> float:
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    rank = max(int(round(p / 100 * len(samples) + 0.5)) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+def rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(requests: int, mix: dict, transport, workload: Workload, warmup: int = 50) -> dict:
+    rnd = workload.rnd
+    operations, weights = list(mix), list(mix.values())
+    samples = {name: {"latency": [], "queries": [], "errors": 0} for name in operations}
+
+    rss_start = rss_kb()
+    started = time.perf_counter()
+    for i in range(warmup + requests):
+        operation = rnd.choices(operations, weights)[0]
+        query, variables, token = workload.build(operation)
+
+        request_started = time.perf_counter()
+        status, content, queries = transport.post(
+            {"query": query, "variables": variables}, token
+        )
+        elapsed = time.perf_counter() - request_started
+        if i == warmup - 1:
+            started = time.perf_counter()
+        if i < warmup:
+            continue
+
+        sample = samples[operation]
+        sample["latency"].append(elapsed * 1000)
+        sample["queries"].append(queries)
+        if status != 200 or b'"errors"' in content:
+            sample["errors"] += 1
+    duration = time.perf_counter() - started
+
+    report = {}
+    for name, sample in samples.items():
+        latency = sorted(sample["latency"])
+        count = len(latency)
+        report[name] = {
+            "count": count,
+            "errors": sample["errors"],
+            "p50_ms": round(percentile(latency, 50), 3),
+            "p95_ms": round(percentile(latency, 95), 3),
+            "p99_ms": round(percentile(latency, 99), 3),
+            "mean_ms": round(sum(latency) / count, 3) if count else 0.0,
+            "queries_mean": round(sum(sample["queries"]) / count, 2) if count else 0.0,
+            "queries_max": max(sample["queries"], default=0),
+        }
+
+    return {
+        "operations": report,
+        "requests": requests,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(requests / duration, 1) if duration else 0.0,
+        "rss_kb": {
+            "start": rss_start,
+            "end": rss_kb(),
+            "max": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in report["operations"].items():
+        before = baseline.get("operations", {}).get(name)
+        if not before or not result["count"]:
+            continue
+        # half a query of slack, means over a random mix jitter a little
+        grown = [
+            metric
+            for metric, slack in (("p95_ms", 0), ("queries_mean", 0.5))
+            if result[metric] > before[metric] * (1 + tolerance) + slack
+        ]
+        print(
+            f'{name:16} p95 {before["p95_ms"]:>9.2f} -> {result["p95_ms"]:>9.2f} ms  '
+            f'queries {before["queries_mean"]:>6.2f} -> {result["queries_mean"]:>6.2f}'
+            + (f'  REGRESSION: {", ".join(grown)}' if grown else "")
+        )
+        if grown:
+            regressions.append(name)
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", action="store_true", help="seed the database first")
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--businesses", type=int, default=100)
+    parser.add_argument("--buyers", type=int, default=1000)
+    parser.add_argument("--carts", type=int, default=50000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--comments", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--transport", choices=("client", "wsgi"), default="client")
+    parser.add_argument("--random-seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as json")
+    parser.add_argument("--baseline", help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+
+    if args.seed:
+        from .seed import seed_activity, seed_catalog
+
+        print(
+            seed_catalog(
+                products=args.products,
+                categories=args.categories,
+                businesses=args.businesses,
+            ),
+            file=sys.stderr,
+        )
+        print(
+            seed_activity(
+                buyers=args.buyers,
+                carts=args.carts,
+                orders=args.orders,
+                comments=args.comments,
+            ),
+            file=sys.stderr,
+        )
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    mix = parse_mix(args.mix)
+    workload = Workload(random.Random(args.random_seed))
+    transport = ClientTransport() if args.transport == "client" else WSGITransport()
+    try:
+        result = run(args.requests, mix, transport, workload, args.warmup)
+    finally:
+        if hasattr(transport, "close"):
+            transport.close()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "database": connection.vendor,
+            "transport": args.transport,
+            "mix": mix,
+            "random_seed": args.random_seed,
+            "debug": settings.DEBUG,
+        },
+        **result,
+    }
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            return 1 if compare(report, json.load(f), args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
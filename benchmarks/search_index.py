@@ -0,0 +1,69 @@
+"""
+Memory per product and query latency of the in-process search index.
+
+usage: python -m benchmarks.search_index [products ...]
+
+Documents are generated in memory with the same vocabulary as
+benchmarks.seed, so no database is needed.
+"""
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from . import setup_django
+
+QUERIES = ("phone", "red lamp", "ca", '"blue phone"', "mini pro cable", "12345")
+
+
+def documents(products: int, seed: int = 0):
+    rnd = random.Random(seed)
+    words = ["red", "blue", "phone", "book", "lamp", "chair", "cable", "case", "pro", "mini"]
+    for i in range(products):
+        yield (
+            i + 1,
+            " ".join(rnd.sample(words, 3)) + f" {i}",
+            " ".join(rnd.choices(words, k=12)),
+            f"category {rnd.randrange(50)}",
+        )
+
+
+def run(products: int) -> dict:
+    from products.search_index import InvertedIndex
+
+    index = InvertedIndex()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index.bulk_load(documents(products))
+    build_seconds = time.perf_counter() - started
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latency = {}
+    for query in QUERIES:
+        samples = []
+        for _ in range(5):
+            started = time.perf_counter()
+            matches = len(index.search(query))
+            samples.append(time.perf_counter() - started)
+        latency[query] = {"ms": round(statistics.median(samples) * 1000, 3), "matches": matches}
+
+    started = time.perf_counter()
+    for i in range(1, 1001):
+        index.add(i, "renamed red lamp", "updated description", "category 1")
+    update_ms = (time.perf_counter() - started) * 1000 / 1000
+
+    return {
+        "products": products,
+        "build_seconds": round(build_seconds, 2),
+        "bytes_per_product": round(memory / products),
+        "update_ms": round(update_ms, 3),
+        "query_latency": latency,
+    }
+
+
+if __name__ == "__main__":
+    setup_django()
+    for products in [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]:
+        print(run(products))
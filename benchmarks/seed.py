@@ -0,0 +1,166 @@
+"""
+Bulk seeding of a benchmark catalog.
+
+Rows are inserted with bulk_create in batches, so seeding a million
+products takes minutes rather than hours on a local Postgres.
+"""
+import random
+from decimal import Decimal
+
+
+def seed_catalog(
+    products: int = 1000000,
+    categories: int = 50,
+    businesses: int = 100,
+    batch_size: int = 10000,
+    seed: int = 0,
+) -> dict:
+    from django.contrib.auth.hashers import make_password
+    from django.db.models import CharField, Value
+    from django.db.models.functions import Cast, Concat
+    from users.models import User
+    from products.models import Business, Category, Product
+    from products.services import category_service
+
+    rnd = random.Random(seed)
+    password = make_password("password")
+
+    User.objects.bulk_create(
+        [
+            User(email=f"seller{i}@bench.local", password=password, first_name="s", last_name="s")
+            for i in range(businesses)
+        ]
+    )
+    sellers = User.objects.filter(email__endswith="@bench.local").order_by("id")
+    Business.objects.bulk_create(
+        [Business(user_id=user.id, name=f"business {user.id}") for user in sellers]
+    )
+    Category.objects.bulk_create(
+        [Category(name=f"category {i}") for i in range(categories)]
+    )
+    # bulk_create skips Category.save, roots get their path as in 0011
+    Category.objects.filter(path="").update(path=Concat(Cast("id", CharField()), Value("/")))
+
+    business_ids = list(Business.objects.values_list("id", flat=True))
+    category_ids = list(Category.objects.values_list("id", flat=True))
+    # long tail: a few large sellers/categories and many small ones
+    business_weights = [1 / (i + 1) for i in range(len(business_ids))]
+    category_weights = [1 / (i + 1) for i in range(len(category_ids))]
+    words = ["red", "blue", "phone", "book", "lamp", "chair", "cable", "case", "pro", "mini"]
+
+    for start in range(0, products, batch_size):
+        Product.objects.bulk_create(
+            [
+                Product(
+                    category_id=rnd.choices(category_ids, category_weights)[0],
+                    business_id=rnd.choices(business_ids, business_weights)[0],
+                    name=" ".join(rnd.sample(words, 3)) + f" {i}",
+                    price=Decimal(rnd.randint(100, 30000)) / 100,
+                    total_availeble=rnd.randint(0, 100),
+                    total_count=100,
+                    description=" ".join(rnd.choices(words, k=12)),
+                )
+                for i in range(start, min(start + batch_size, products))
+            ]
+        )
+
+    # bulk_create skips the signals that keep the counts
+    category_service.reconcile_product_counts()
+
+    return {
+        "products": Product.objects.count(),
+        "categories": len(category_ids),
+        "businesses": len(business_ids),
+    }
+
+
+def seed_activity(
+    buyers: int = 1000,
+    carts: int = 50000,
+    orders: int = 100000,
+    comments: int = 100000,
+    batch_size: int = 10000,
+    seed: int = 0,
+) -> dict:
+    """Buyers with carts, past checkouts and comments over the seeded catalog."""
+    from django.contrib.auth.hashers import make_password
+    from users.models import User
+    from products.models import Cart, Order, OrderLine, Product, ProductComment
+    from products.services import rating_service
+
+    rnd = random.Random(seed)
+    password = make_password("password")
+
+    User.objects.bulk_create(
+        [
+            User(email=f"buyer{i}@bench.local", password=password, first_name="b", last_name="b")
+            for i in range(buyers)
+        ]
+    )
+    buyer_ids = list(
+        User.objects.filter(email__startswith="buyer", email__endswith="@bench.local")
+        .values_list("id", flat=True)
+    )
+    products = list(Product.objects.values_list("id", "business_id", "price", "name"))
+
+    def batches(total, build):
+        for start in range(0, total, batch_size):
+            yield [build() for _ in range(min(batch_size, total - start))]
+
+    def cart():
+        return Cart(user_id=rnd.choice(buyer_ids), product_id=rnd.choice(products)[0])
+
+    def order():
+        # single line orders, the lines are attached once the orders have ids
+        product_id, business_id, price, name = rnd.choice(products)
+        quantity = rnd.randint(1, 3)
+        line = OrderLine(
+            product_id=product_id,
+            product_name=name,
+            quantity=quantity,
+            price=price,
+            total_price=price * quantity,
+        )
+        return Order(
+            user_id=rnd.choice(buyer_ids),
+            business_id=business_id,
+            total_price=line.total_price,
+            total_quantity=quantity,
+            line_count=1,
+        ), line
+
+    def comment():
+        return ProductComment(
+            user_id=rnd.choice(buyer_ids),
+            product_id=rnd.choice(products)[0],
+            comment="benchmark comment",
+            rate=rnd.randint(1, 5),
+        )
+
+    for model, total, build in (
+        (Cart, carts, cart),
+        (ProductComment, comments, comment),
+    ):
+        for objs in batches(total, build):
+            model.objects.bulk_create(objs)
+
+    # bulk_create skips the incremental rating updates
+    rating_service.reconcile_ratings(batch_size)
+
+    for pairs in batches(orders, order):
+        last_id = Order.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        Order.objects.bulk_create([o for o, _ in pairs])
+        # bulk_create only returns ids on postgres
+        order_ids = Order.objects.filter(pk__gt=last_id).order_by("pk").values_list(
+            "pk", flat=True
+        )
+        for order_id, (_, line) in zip(order_ids, pairs):
+            line.order_id = order_id
+        OrderLine.objects.bulk_create([line for _, line in pairs])
+
+    return {
+        "buyers": len(buyer_ids),
+        "carts": Cart.objects.count(),
+        "orders": Order.objects.count(),
+        "comments": ProductComment.objects.count(),
+    }
@@ -0,0 +1,186 @@
+"""
+Requests per second of the django dev server against gunicorn, on the same
+machine and data.
+
+usage: python -m benchmarks.serving [--servers runserver,gunicorn]
+           [--concurrency 8] [--duration 30] [--mix product=60,products=30,me=10]
+           [--workers N] [--threads N] [--output serving.json]
+
+Each server is started as a subprocess of this one, with the same
+DJANGO_SETTINGS_MODULE and DEBUG off, on a free local port and waited on
+through /health/live/. `--concurrency` client threads then replay requests
+of benchmarks.loadtest's workload over HTTP for `--duration` seconds.
+Operations are read-only, seed the database with `benchmarks.loadtest
+--seed` first. The client shares the machine with the server, keep it in
+mind on few cores.
+
+The report is json: per server throughput, errors and p50/p95/p99 latency.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from . import setup_django
+from .loadtest import Workload, git_commit, parse_mix, percentile
+
+DEFAULT_MIX = "product=60,products=30,me=10"
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_command(server: str, port: int, workers=None, threads=None) -> list:
+    if server == "runserver":
+        return [sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"]
+    # gunicorn 20.0 has no __main__, its script sits next to the interpreter
+    command = [
+        os.path.join(os.path.dirname(sys.executable), "gunicorn"), "-c", "gunicorn.conf.py",
+        "--bind", f"127.0.0.1:{port}", "--access-logfile", "/dev/null",
+    ]
+    if workers:
+        command += ["--workers", str(workers)]
+    if threads:
+        command += ["--threads", str(threads)]
+    return command + ["ecommerce_api.wsgi"]
+
+
+def wait_live(url: str, process, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/health/live/", timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise SystemExit(f"{url} not live after {timeout}s")
+
+
+def drive(url: str, requests: list, concurrency: int, duration: float) -> dict:
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset: int):
+        i = offset
+        while time.perf_counter() < deadline:
+            query, variables, token = requests[i % len(requests)]
+            i += concurrency
+            headers = {"Content-Type": "application/json"}
+            if token:
+                headers["Authorization"] = f"JWT {token}"
+            body = json.dumps({"query": query, "variables": variables}).encode()
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(
+                    urllib.request.Request(f"{url}/graphview/", body, headers), timeout=30
+                ) as response:
+                    failed = b'"errors"' in response.read()
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += failed
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def bench(server: str, requests: list, args) -> dict:
+    port = free_port()
+    env = dict(os.environ, DEBUG="False", GRAPHQL_PROFILING="False")
+    process = subprocess.Popen(
+        server_command(server, port, args.workers, args.threads),
+        cwd=BASE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_live(url, process)
+        # fills the per process caches and the connections
+        drive(url, requests, args.concurrency, args.warmup)
+        return drive(url, requests, args.concurrency, args.duration)
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--servers", default="runserver,gunicorn")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--workers", type=int, help="gunicorn workers, WEB_CONCURRENCY otherwise")
+    parser.add_argument("--threads", type=int, help="gunicorn threads per worker")
+    parser.add_argument("--random-seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as json")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+
+    mix = parse_mix(args.mix)
+    workload = Workload(random.Random(args.random_seed))
+    operations, weights = list(mix), list(mix.values())
+    requests = [
+        workload.build(workload.rnd.choices(operations, weights)[0]) for _ in range(5000)
+    ]
+    connection.close()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "database": connection.vendor,
+            "cpus": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": mix,
+        },
+        "servers": {
+            server: bench(server, requests, args) for server in args.servers.split(",")
+        },
+    }
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Cold vs warm TokenManager.decode_token throughput.
+
+usage: python -m benchmarks.token_decode [iterations]
+"""
+import sys
+import time
+
+from . import setup_django
+
+
+def run(iterations: int = 20000) -> dict:
+    from ecommerce_api.auth import TokenManager, token_cache
+
+    tokens = [TokenManager.get_access({"user_id": i}) for i in range(iterations)]
+
+    token_cache.clear()
+    token_cache.maxsize = iterations
+    started = time.perf_counter()
+    for token in tokens:
+        TokenManager.decode_token(token)
+    cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for token in tokens:
+        TokenManager.decode_token(token)
+    warm = time.perf_counter() - started
+
+    return {
+        "iterations": iterations,
+        "cold_per_sec": round(iterations / cold),
+        "warm_per_sec": round(iterations / warm),
+        "speedup": round(cold / warm, 2),
+        "cache": token_cache.stats(),
+    }
+
+
+if __name__ == "__main__":
+    setup_django()
+    print(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
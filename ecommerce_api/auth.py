@@ -1,10 +1,19 @@
 from typing import Optional
+import hashlib
 import jwt
 from datetime import datetime
 from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
 
 from users.models import User
 
+from .cache import LRUCache
+
+
+# verified claims keyed by token digest, each entry expires at the token `exp`
+token_cache = LRUCache(getattr(settings, "AUTH_TOKEN_CACHE_SIZE", 4096))
+
 
 class TokenManager:
     @staticmethod
@@ -19,15 +28,27 @@ class TokenManager:
 
     @staticmethod
     def decode_token(token):
-        try:
-            decoded = jwt.decode(token, key=settings.SECRET_KEY, algorithms="HS256")
-        except jwt.DecodeError:
-            return None
-
-        if datetime.now().timestamp() > decoded["exp"]:
+        if isinstance(token, str):
+            token = token.encode()
+        key = hashlib.sha256(token).digest()
+        now = datetime.now().timestamp()
+
+        decoded = token_cache.get(key)
+        if decoded is None:
+            try:
+                decoded = jwt.decode(token, key=settings.SECRET_KEY, algorithms="HS256")
+            except jwt.InvalidTokenError:
+                return None
+
+            if now > decoded["exp"]:
+                return None
+
+            token_cache.set(key, decoded, decoded["exp"] - now)
+        elif now > decoded["exp"]:
+            token_cache.delete(key)
             return None
 
-        return decoded
+        return dict(decoded)
 
     @staticmethod
     def get_access(payload):
@@ -38,6 +59,90 @@ class TokenManager:
         return TokenManager.get_token(7 * 24 * 60, payload, "refresh")
 
 
+class UserCache(object):
+    """
+    Two tier cache of authenticated users.
+
+    The local tier is a short TTL LRU per process, the optional shared tier
+    lives behind django cache framework and is keyed by user id plus a
+    per-user version, bumped by `invalidate`. Other processes pick up an
+    invalidation once their local entry expires, so LOCAL_TTL bounds how long
+    a deactivated user can still authenticate.
+    """
+
+    key_prefix = "auth:user"
+
+    def __init__(self, config: Optional[dict] = None):
+        if config is None:
+            config = getattr(settings, "AUTH_USER_CACHE", {})
+        self.local = LRUCache(config.get("LOCAL_SIZE", 1024), config.get("LOCAL_TTL", 30))
+        self.shared_alias = config.get("SHARED_ALIAS")
+        self.shared_ttl = config.get("SHARED_TTL", 300)
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.fields = [field.attname for field in User._meta.concrete_fields]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def get(self, user_id) -> Optional[User]:
+        values = self.local.get(user_id)
+        if values is None:
+            values = self._get_shared(user_id)
+            if values is None:
+                return None
+            self.local.set(user_id, values)
+        return User.from_db(DEFAULT_DB_ALIAS, self.fields, values)
+
+    def invalidate(self, user_id):
+        self.local.delete(user_id)
+        shared = self.shared
+        if shared is None:
+            return
+        try:
+            shared.incr(self._version_key(user_id))
+        except ValueError:
+            shared.set(self._version_key(user_id), 1, None)
+
+    def clear(self):
+        self.local.clear()
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "local": self.local.stats(),
+            "shared": {"hits": self.shared_hits, "misses": self.shared_misses},
+        }
+
+    def _get_shared(self, user_id) -> Optional[tuple]:
+        shared = self.shared
+        if shared is None:
+            return self._load(user_id)
+
+        key = f"{self.key_prefix}:{user_id}:{shared.get(self._version_key(user_id), 0)}"
+        values = shared.get(key)
+        if values is not None:
+            self.shared_hits += 1
+            return values
+
+        self.shared_misses += 1
+        values = self._load(user_id)
+        if values is not None:
+            shared.set(key, values, self.shared_ttl)
+        return values
+
+    def _load(self, user_id) -> Optional[tuple]:
+        return User.objects.filter(pk=user_id).values_list(*self.fields).first()
+
+    def _version_key(self, user_id) -> str:
+        return f"{self.key_prefix}:{user_id}:version"
+
+
+user_cache = UserCache()
+
+
 class Auth(object):
     def __init__(self, request):
         self.request = request
@@ -65,6 +170,7 @@ class Auth(object):
 
     @staticmethod
     def get_user(user_id) -> Optional[User]:
-
-        user = User.objects.filter(pk=user_id).first()
+        user = user_cache.get(user_id)
+        if user is None or not user.is_active:
+            return None
         return user
@@ -0,0 +1,22 @@
+from django.conf import settings
+
+# backends that keep entries inside one process
+LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def shared_aliases() -> dict:
+    """Cache aliases whose entries and versions every process must see."""
+    aliases = {
+        "CATEGORY_CACHE": settings.CATEGORY_CACHE.get("ALIAS"),
+        "PERSISTED_QUERIES": settings.PERSISTED_QUERIES.get("ALIAS"),
+        "RESPONSE_CACHE": settings.RESPONSE_CACHE.get("ALIAS"),
+        "AUTH_USER_CACHE": settings.AUTH_USER_CACHE.get("SHARED_ALIAS"),
+    }
+    return {name: alias for name, alias in aliases.items() if alias}
+
+
+def is_local(alias: str) -> bool:
+    return settings.CACHES.get(alias, {}).get("BACKEND") in LOCAL_BACKENDS
@@ -0,0 +1,156 @@
+from typing import Optional
+
+from django.conf import settings
+from graphql.error import GraphQLError
+from graphql.language import ast
+from graphql.type import GraphQLList, GraphQLNonNull, GraphQLObjectType
+from graphql.utils.type_from_ast import type_from_ast
+from graphql.utils.value_from_ast import value_from_ast
+
+
+class QueryCostAnalyzer(object):
+    """
+    Static cost and depth of an operation, computed from its document.
+
+    Every field selecting an object costs 1 and a scalar 0, unless
+    FIELD_COSTS names it as "Type.field". A field is paid once per parent
+    the query can return, so the cost of a list's children is multiplied
+    by the list size: the page size (`pageSize` or `first`) for the results
+    of a paginated field, LIST_SIZE for the unbounded relation lists. The
+    results list itself costs its page size, scalars only are not free.
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        if config is None:
+            config = getattr(settings, "QUERY_COST", {})
+        self.max_cost = config.get("MAX_COST")
+        self.max_depth = config.get("MAX_DEPTH")
+        self.list_size = config.get("LIST_SIZE", 100)
+        self.field_costs = config.get("FIELD_COSTS", {})
+        self.page_size = settings.GRAPHENE.get("PAGE_SIZE", 10)
+        self.max_page_size = settings.GRAPHENE.get("MAX_PAGE_SIZE", 100)
+
+    def analyze(self, schema, document_ast, operation_name=None, variables=None) -> dict:
+        operation, fragments = None, {}
+        for definition in document_ast.definitions:
+            if isinstance(definition, ast.FragmentDefinition):
+                fragments[definition.name.value] = definition
+            elif isinstance(definition, ast.OperationDefinition):
+                if operation_name is None or (
+                    definition.name and definition.name.value == operation_name
+                ):
+                    operation = operation or definition
+        if operation is None:
+            return {"cost": 0, "depth": 0}
+
+        root = {
+            "query": schema.get_query_type,
+            "mutation": schema.get_mutation_type,
+            "subscription": schema.get_subscription_type,
+        }[operation.operation]()
+        context = (schema, fragments, self._variables(schema, operation, variables))
+        return self._selection_cost(context, root, operation.selection_set, 1, None)
+
+    def check(self, cost: dict) -> list:
+        """Errors for the budgets a computed cost exceeds."""
+        errors = []
+        if self.max_depth is not None and cost["depth"] > self.max_depth:
+            errors.append(
+                GraphQLError(
+                    f'query depth {cost["depth"]} exceeds the limit of {self.max_depth}'
+                )
+            )
+        if self.max_cost is not None and cost["cost"] > self.max_cost:
+            errors.append(
+                GraphQLError(
+                    f'query cost {cost["cost"]} exceeds the limit of {self.max_cost}'
+                )
+            )
+        return errors
+
+    def _selection_cost(self, context, parent, selection_set, multiplier, page_size) -> dict:
+        schema, fragments, variables = context
+        total = {"cost": 0, "depth": 0}
+        if selection_set is None or parent is None:
+            return total
+
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                cost = self._field_cost(context, parent, selection, multiplier, page_size)
+            else:
+                if isinstance(selection, ast.FragmentSpread):
+                    fragment = fragments.get(selection.name.value)
+                    if fragment is None:
+                        continue
+                    condition, selections = fragment.type_condition, fragment.selection_set
+                else:
+                    condition, selections = selection.type_condition, selection.selection_set
+                fragment_type = schema.get_type(condition.name.value) if condition else parent
+                cost = self._selection_cost(
+                    context, fragment_type, selections, multiplier, page_size
+                )
+            total["cost"] += cost["cost"]
+            total["depth"] = max(total["depth"], cost["depth"])
+        return total
+
+    def _field_cost(self, context, parent, selection, multiplier, page_size) -> dict:
+        name = selection.name.value
+        fields = getattr(parent, "fields", {})
+        # introspection is left to the validation rules
+        if name.startswith("__") or name not in fields:
+            return {"cost": 0, "depth": 0}
+
+        field_type, is_list = fields[name].type, False
+        while isinstance(field_type, (GraphQLNonNull, GraphQLList)):
+            is_list = is_list or isinstance(field_type, GraphQLList)
+            field_type = field_type.of_type
+
+        is_object = isinstance(field_type, GraphQLObjectType)
+        cost = self.field_costs.get(f"{parent.name}.{name}", 1 if is_object else 0)
+        if is_list and page_size and name == "results":
+            # one row per item of the page, whatever is selected of it
+            cost = max(cost, 1) * page_size
+        cost *= multiplier
+        if not is_object:
+            return {"cost": cost, "depth": 1}
+
+        child_page_size = None
+        if field_type.name.endswith("Paginated"):
+            child_page_size = self._page_size(context, selection)
+        if is_list:
+            multiplier *= page_size if page_size and name == "results" else self.list_size
+
+        children = self._selection_cost(
+            context, field_type, selection.selection_set, multiplier, child_page_size
+        )
+        return {"cost": cost + children["cost"], "depth": children["depth"] + 1}
+
+    @staticmethod
+    def _variables(schema, operation, variables) -> dict:
+        """The variables of the request with the operation's defaults."""
+        values = dict(variables or {})
+        for definition in operation.variable_definitions or ():
+            name = definition.variable.name.value
+            if name not in values and definition.default_value is not None:
+                values[name] = value_from_ast(
+                    definition.default_value, type_from_ast(schema, definition.type)
+                )
+        return values
+
+    def _page_size(self, context, selection) -> int:
+        _, _, variables = context
+        arguments = {}
+        for argument in selection.arguments:
+            value = argument.value
+            if isinstance(value, ast.Variable):
+                value = variables.get(value.name.value)
+            elif isinstance(value, ast.IntValue):
+                value = int(value.value)
+            arguments[argument.name.value] = value
+        # same precedence and cap as the pagination
+        size = arguments.get("first") or arguments.get("pageSize")
+        size = size if isinstance(size, int) and size > 0 else self.page_size
+        return min(size, self.max_page_size)
+
+
+query_cost = QueryCostAnalyzer()
@@ -0,0 +1,179 @@
+import hashlib
+import json
+from functools import partial
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql.backend.base import GraphQLDocument
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.execution import ExecutionResult, execute
+from graphql.language.parser import parse
+from graphql.validation import validate
+
+from .cache import LRUCache
+from .complexity import query_cost
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def _execute_validated(errors, schema, document_ast, *args, **kwargs):
+    if errors:
+        return ExecutionResult(errors=errors, invalid=True)
+
+    # the cost depends on the variables, computed per execution
+    cost = query_cost.analyze(
+        schema, document_ast, kwargs.get("operation_name"), kwargs.get("variable_values")
+    )
+    context = kwargs.get("context_value")
+    if context is not None:
+        context.query_cost = cost
+    errors = query_cost.check(cost)
+    if errors:
+        return ExecutionResult(errors=errors, invalid=True)
+
+    return execute(schema, document_ast, *args, **kwargs)
+
+
+class CachedDocumentBackend(GraphQLCoreBackend):
+    """
+    graphql-core backend that parses and validates a query string once.
+
+    Parsed documents are kept by the SHA-256 of the query string, validated
+    ones by schema and hash, in process-local LRUs. Validation errors are
+    kept with the document, a cached invalid query fails without being
+    validated again. Syntax errors are raised and never cached.
+    """
+
+    def __init__(self, maxsize: int = 512, executor=None):
+        super().__init__(executor)
+        self.parsed = LRUCache(maxsize)
+        self.validated = LRUCache(maxsize)
+
+    def parse(self, query: str):
+        key = query_hash(query)
+        document_ast = self.parsed.get(key)
+        if document_ast is None:
+            document_ast = parse(query)
+            self.parsed.set(key, document_ast)
+        return document_ast
+
+    def document_from_string(self, schema, document_string):
+        if not isinstance(document_string, str):
+            return super().document_from_string(schema, document_string)
+
+        key = (id(schema), query_hash(document_string))
+        document = self.validated.get(key)
+        if document is None:
+            document_ast = self.parse(document_string)
+            document = GraphQLDocument(
+                schema=schema,
+                document_string=document_string,
+                document_ast=document_ast,
+                execute=partial(
+                    _execute_validated,
+                    validate(schema, document_ast),
+                    schema,
+                    document_ast,
+                    **self.execute_params,
+                ),
+            )
+            self.validated.set(key, document)
+        return document
+
+    def clear(self):
+        self.parsed.clear()
+        self.validated.clear()
+
+    def stats(self) -> dict:
+        return {"parsed": self.parsed.stats(), "validated": self.validated.stats()}
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+    def as_error(self) -> dict:
+        return {"message": str(self), "extensions": {"code": self.code}}
+
+
+class PersistedQueries(object):
+    """
+    Automatic persisted queries, the protocol Apollo clients speak.
+
+    A client sends `extensions.persistedQuery.sha256Hash` without the query.
+    An unknown hash answers PersistedQueryNotFound, the client then retries
+    with the query and the hash, which registers it. Registered queries live
+    in the django cache, with a local LRU in front.
+    """
+
+    key_prefix = "graphql:persisted"
+
+    def __init__(self, config: Optional[dict] = None):
+        if config is None:
+            config = getattr(settings, "PERSISTED_QUERIES", {})
+        self.alias = config.get("ALIAS", "default")
+        self.ttl = config.get("TTL", 86400)
+        self.local = LRUCache(config.get("LOCAL_SIZE", 1024))
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def resolve(self, request, data) -> Optional[str]:
+        """
+        The query of a persisted query request, None when the request does
+        not use the protocol. Raises PersistedQueryError otherwise.
+        """
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                return None
+        persisted = (extensions or {}).get("persistedQuery")
+        if not isinstance(persisted, dict):
+            return None
+
+        if persisted.get("version") != 1:
+            raise PersistedQueryError(
+                "PersistedQueryNotSupported", "PERSISTED_QUERY_NOT_SUPPORTED"
+            )
+        digest = str(persisted.get("sha256Hash") or "").lower()
+
+        query = request.GET.get("query") or data.get("query")
+        if query:
+            if query_hash(query) != digest:
+                raise PersistedQueryError("provided sha does not match query", "BAD_REQUEST")
+            self.register(digest, query)
+            return query
+
+        query = self.get(digest)
+        if query is None:
+            raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+        return query
+
+    def get(self, digest: str) -> Optional[str]:
+        query = self.local.get(digest)
+        if query is None:
+            query = self.shared.get(f"{self.key_prefix}:{digest}")
+            if query is not None:
+                self.local.set(digest, query)
+        return query
+
+    def register(self, digest: str, query: str):
+        if self.local.get(digest) is None:
+            self.shared.set(f"{self.key_prefix}:{digest}", query, self.ttl)
+            self.local.set(digest, query)
+
+    def clear(self):
+        self.local.clear()
+
+
+document_backend = CachedDocumentBackend(
+    getattr(settings, "GRAPHQL_DOCUMENT_CACHE_SIZE", 512)
+)
+persisted_queries = PersistedQueries()
@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+from django.db import connections
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from promise import Promise
+from promise.dataloader import DataLoader
+
+
+class ModelLoader(DataLoader):
+    """Instances of `model` by primary key."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def batch_load_fn(self, keys):
+        objects = self.model._default_manager.in_bulk(keys)
+        return Promise.resolve([objects.get(key) for key in keys])
+
+
+class RelatedLoader(DataLoader):
+    """
+    Rows of `model` grouped by the parent key reached through `lookup`.
+
+    Serves reverse foreign keys, reverse one-to-ones (`many=False`) and both
+    sides of many-to-many relations with one `IN` query per batch.
+    """
+
+    def __init__(self, model, lookup, many=True):
+        super().__init__()
+        self.model = model
+        self.lookup = lookup
+        self.many = many
+
+    def batch_load_fn(self, keys):
+        qs = self.model._default_manager.filter(**{f"{self.lookup}__in": keys})
+        grouped = defaultdict(list)
+        for obj in qs.annotate(_loader_key=F(self.lookup)):
+            grouped[obj._loader_key].append(obj)
+
+        if self.many:
+            return Promise.resolve([grouped[key] for key in keys])
+        return Promise.resolve([(grouped[key] or [None])[0] for key in keys])
+
+
+class PageLoader(DataLoader):
+    """
+    The first `limit` rows of `queryset` for each value of `field`.
+
+    Every key of a batch is served by one query and no key ever reads more
+    than `limit` rows: a UNION ALL of one LIMITed index scan per key where
+    the backend allows it, rows ranked with ROW_NUMBER() otherwise.
+    """
+
+    def __init__(self, queryset, field, limit, order_by):
+        super().__init__()
+        self.queryset = queryset
+        self.field = field
+        self.limit = limit
+        self.order_by = order_by
+
+    def batch_load_fn(self, keys):
+        connection = connections[self.queryset.db]
+        quote = connection.ops.quote_name
+        meta = self.queryset.model._meta
+        pk = f"{quote(meta.db_table)}.{quote(meta.pk.column)}"
+
+        if connection.features.supports_slicing_ordering_in_compound:
+            branches = [
+                self.queryset.filter(**{self.field: key}).values("pk")[: self.limit]
+                for key in keys
+            ]
+            if len(branches) > 1:
+                branches[0] = branches[0].union(*branches[1:], all=True)
+            sql, params = branches[0].query.sql_with_params()
+        else:
+            ranked = (
+                self.queryset.filter(**{f"{self.field}__in": keys})
+                .order_by()
+                .annotate(
+                    _row=Window(
+                        RowNumber(), partition_by=[F(self.field)], order_by=self.order_by
+                    )
+                )
+                .values("pk", "_row")
+            )
+            sql, params = ranked.query.sql_with_params()
+            sql = f"SELECT {quote(meta.pk.column)} FROM ({sql}) ranked WHERE _row <= %s"
+            params = (*params, self.limit)
+
+        # a subquery in pk__in can't be a compound or filter on a window
+        top = self.queryset.extra(where=[f"{pk} IN ({sql})"], params=params)
+
+        grouped = defaultdict(list)
+        for obj in top.annotate(_loader_key=F(self.field)):
+            grouped[obj._loader_key].append(obj)
+        return Promise.resolve([grouped[key] for key in keys])
+
+
+def get_page_loader(context, queryset, field, limit, order_by):
+    """Loader for the first pages of one nested paginated field."""
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = context.loaders = {}
+
+    key = (queryset.model, field, limit, str(queryset.query))
+    if key not in loaders:
+        loaders[key] = PageLoader(queryset, field, limit, order_by)
+    return loaders[key]
+
+
+def get_loader(context, field):
+    """Loader for a model relation field, created once per request."""
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = context.loaders = {}
+
+    if field.concrete and not field.many_to_many:
+        key = field.related_model
+    else:
+        key = (field.model, field.name)
+
+    if key not in loaders:
+        if field.concrete and not field.many_to_many:
+            loaders[key] = ModelLoader(field.related_model)
+        elif field.many_to_many and field.concrete:
+            loaders[key] = RelatedLoader(field.related_model, field.related_query_name())
+        else:
+            loaders[key] = RelatedLoader(
+                field.related_model, field.field.name, many=not field.one_to_one
+            )
+    return loaders[key]
+
+
+def resolve_related(name):
+    """
+    Resolver for the relation `name` of a DjangoObjectType.
+
+    Values already loaded by select_related/prefetch_related are returned
+    as is, anything else goes through the request's DataLoaders.
+    """
+
+    def resolver(root, info, **kwargs):
+        field = root._meta.get_field(name)
+
+        if field.many_to_many or field.one_to_many:
+            if name in getattr(root, "_prefetched_objects_cache", {}):
+                return getattr(root, name).all()
+            return get_loader(info.context, field).load(root.pk)
+
+        if field.is_cached(root):
+            return getattr(root, name, None)
+
+        if field.concrete:
+            key = getattr(root, field.attname)
+            if key is None:
+                return None
+            return get_loader(info.context, field).load(key)
+
+        return get_loader(info.context, field).load(root.pk)
+
+    return resolver
@@ -1,10 +1,18 @@
+import time
+
 from .auth import Auth
 from .pagination import resolve_paginated
 
 
 class CustomAuthMiddleware(object):
+    context_flag = "_graphql_auth_resolved"
+
     def resolve(self, next, root, info, **kwargs):
-        info.context.user = self.authorize_user(info)
+        # authenticate once per request on the first root field and reuse
+        # the memoized user for every nested field resolve
+        if root is None and not getattr(info.context, self.context_flag, False):
+            info.context.user = self.authorize_user(info)
+            setattr(info.context, self.context_flag, True)
         return next(root, info, **kwargs)
 
     @staticmethod
@@ -23,8 +31,35 @@ class CustomPaginationMiddleware(object):
         if is_paginated:
             page = kwargs.pop("page", 1)
             page_size = kwargs.pop("page_size", 1)
+            # `first` is the page size of connection style fields
+            page_size = kwargs.pop("first", None) or page_size
+            after = kwargs.pop("after", None)
+            before = kwargs.pop("before", None)
+            # get() re-raises what the resolver raised, e.g. a permission error
             return resolve_paginated(
-                next(root, info, **kwargs).value, info, page, page_size
+                next(root, info, **kwargs).get(), info, page, page_size, after, before
             )
 
         return next(root, info, **kwargs)
+
+
+class ProfilingMiddleware(object):
+    """
+    Times resolvers for the request profile, see ecommerce_api/profiling.py.
+
+    Listed last in GRAPHENE['MIDDLEWARE'], which makes it the outermost
+    middleware, the pagination queries are then charged to their field.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        profile = getattr(info.context, "graphql_profile", None)
+        if profile is None:
+            return next(root, info, **kwargs)
+
+        path = ".".join(str(part) for part in info.path if not isinstance(part, int))
+        profile.enter(path)
+        started = time.perf_counter()
+        try:
+            return next(root, info, **kwargs)
+        finally:
+            profile.exit(path, time.perf_counter() - started)
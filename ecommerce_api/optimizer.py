@@ -0,0 +1,141 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import ast
+from graphql.type import GraphQLList, GraphQLNonNull
+
+
+def collect_fields(field_asts, fragments) -> dict:
+    """Sub-field ASTs of `field_asts` grouped by field name, fragments inlined."""
+    fields = {}
+
+    def collect(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, ast.FragmentSpread):
+                collect(fragments[selection.name.value].selection_set)
+            elif isinstance(selection, ast.InlineFragment):
+                collect(selection.selection_set)
+
+    for field_ast in field_asts:
+        collect(field_ast.selection_set)
+    return fields
+
+
+def unwrap_type(gql_type):
+    while isinstance(gql_type, (GraphQLList, GraphQLNonNull)):
+        gql_type = gql_type.of_type
+    return gql_type
+
+
+class QueryPlan(object):
+    """select_related/prefetch_related/only() collected for one queryset."""
+
+    def __init__(self, model):
+        self.model = model
+        self.only = set()
+        self.select_related = set()
+        self.prefetch_related = []
+
+    def apply(self, qs):
+        if self.select_related:
+            qs = qs.select_related(*sorted(self.select_related))
+        if self.prefetch_related:
+            qs = qs.prefetch_related(*self.prefetch_related)
+        return qs.only(*sorted(self.only))
+
+    def add_selection(self, model, gql_type, field_asts, fragments, prefix=""):
+        self.only.add(prefix + model._meta.pk.attname)
+
+        for name, asts in collect_fields(field_asts, fragments).items():
+            if name.startswith("__") or name not in gql_type.fields:
+                continue
+
+            try:
+                field = model._meta.get_field(to_snake_case(name))
+            except FieldDoesNotExist:
+                field = None
+
+            if field is None or not (field.concrete or field.is_relation):
+                # custom resolver, load what the type says it reads or
+                # every column when it doesn't say
+                columns = getattr(gql_type.graphene_type, "model_columns", {})
+                columns = columns.get(to_snake_case(name))
+                if columns is None:
+                    self.add_all_columns(model, prefix)
+                else:
+                    self.only.update(prefix + column for column in columns)
+                continue
+
+            if not field.is_relation:
+                self.only.add(prefix + field.attname)
+                continue
+
+            child_type = unwrap_type(gql_type.fields[name].type)
+            if field.many_to_one or field.one_to_one:
+                if field.concrete:
+                    self.only.add(prefix + field.attname)
+                path = prefix + field.name
+                self.select_related.add(path)
+                self.add_selection(
+                    field.related_model, child_type, asts, fragments, f"{path}__"
+                )
+            else:
+                child = QueryPlan(field.related_model)
+                if field.one_to_many:
+                    child.only.add(field.field.attname)
+                child.add_selection(field.related_model, child_type, asts, fragments)
+                queryset = child.apply(field.related_model._default_manager.all())
+                self.prefetch_related.append(
+                    Prefetch(prefix + field.name, queryset=queryset)
+                )
+
+    def add_ordering(self, qs):
+        """Keep ordering columns loaded, cursors are built from them."""
+        ordering = list(qs.query.order_by)
+        if not ordering and qs.query.default_ordering:
+            ordering = list(qs.model._meta.ordering)
+
+        for term in ordering:
+            if not isinstance(term, str) or term.lstrip("-") in qs.query.annotations:
+                continue
+
+            model, path = self.model, ""
+            parts = term.lstrip("-").split("__")
+            for i, part in enumerate(parts):
+                field = model._meta.pk if part == "pk" else model._meta.get_field(part)
+                if field.concrete:
+                    self.only.add(path + field.attname)
+                if i == len(parts) - 1 or not (field.many_to_one or field.one_to_one):
+                    break
+                path = f"{path}{field.name}__"
+                self.select_related.add(path[:-2])
+                model = field.related_model
+
+    def add_all_columns(self, model, prefix=""):
+        for field in model._meta.concrete_fields:
+            self.only.add(prefix + field.attname)
+
+
+def optimize_queryset(qs, info):
+    """
+    Load only what the client asked for.
+
+    Walks the selection set of the field being resolved (the `results` of
+    a paginated type) and turns it into select_related for to-one
+    relations, prefetch_related with planned querysets for to-many
+    relations, and only() for the selected columns.
+    """
+    gql_type = unwrap_type(info.return_type)
+    field_asts = info.field_asts
+    if gql_type.name.endswith("Paginated"):
+        field_asts = collect_fields(field_asts, info.fragments).get("results", [])
+        gql_type = unwrap_type(gql_type.fields["results"].type)
+
+    plan = QueryPlan(qs.model)
+    plan.add_selection(qs.model, gql_type, field_asts, info.fragments)
+    plan.add_ordering(qs)
+    return plan.apply(qs)
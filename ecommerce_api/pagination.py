@@ -1,9 +1,22 @@
+import base64
+import datetime
+import decimal
+import json
+import uuid
+from functools import lru_cache
+
 import graphene
 from django.conf import settings
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import F, Q, QuerySet
+from django.db.models.expressions import OrderBy
+from graphql.language import ast
+
+from .loaders import get_page_loader
 
 
-def paginate(model_type):
+# one class per type, graphene rejects two types of the same name
+@lru_cache(maxsize=None)
+def paginate(model_type, cursor=False, facets=None):
 
     structure = {
         "total": graphene.Int(),
@@ -14,37 +27,297 @@ def paginate(model_type):
         "results": graphene.List(model_type),
     }
 
+    if cursor:
+        # opaque keyset cursors of the last/first row, passed back as the
+        # `after`/`before` arguments of the paginated field
+        structure["after"] = graphene.String()
+        structure["before"] = graphene.String()
+
+    if facets is not None:
+        # counts over the whole filtered query, resolved by `facets` from it
+        structure["facets"] = graphene.Field(facets)
+
     return type(f"{model_type}Paginated", (graphene.ObjectType,), structure)
 
 
-def resolve_paginated(query_data, info, page, page_size):
-    def get_paginated_data(qs, paginated_type, page, page_size=None):
-        if not page_size:
-            page_size = settings.GRAPHENE.get("PAGE_SIZE", 10)
-
-        try:
-            qs.exists()
-        except:
-            raise Exception(qs)
-
-        p = Paginator(qs, page_size)
-
-        try:
-            page_obj = p.page(page)
-        except PageNotAnInteger:
-            page_obj = p.page(1)
-        except EmptyPage:
-            page_obj = p.page(p.num_pages)
-
-        result = paginated_type.graphene_type(
-            total=p.num_pages,
-            size=qs.count(),
-            current=page_obj.number,
-            has_next=page_obj.has_next(),
-            has_prev=page_obj.has_previous(),
-            results=page_obj.object_list,
+class Partition(object):
+    """
+    The rows of `queryset` whose `field` equals `value`.
+
+    Returned by resolvers of nested paginated fields, first pages of all the
+    parents are then loaded in one query instead of one query per parent.
+    """
+
+    def __init__(self, queryset, field, value):
+        self.queryset = queryset
+        self.field = field
+        self.value = value
+
+    def get_queryset(self):
+        return self.queryset.filter(**{self.field: self.value})
+
+
+def get_selected_fields(selection_set, fragments) -> set:
+    """Names of the fields requested directly in a selection set."""
+    fields = set()
+    if selection_set is None:
+        return fields
+
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            fields.add(selection.name.value)
+        elif isinstance(selection, ast.FragmentSpread):
+            fragment = fragments[selection.name.value]
+            fields |= get_selected_fields(fragment.selection_set, fragments)
+        elif isinstance(selection, ast.InlineFragment):
+            fields |= get_selected_fields(selection.selection_set, fragments)
+    return fields
+
+
+def resolve_paginated(query_data, info, page, page_size, after=None, before=None):
+    """
+    Slice one page out of `query_data`.
+
+    Runs at most one COUNT, and only when the client selects `total` or
+    `size`. `has_next` comes from fetching one row past the page instead.
+    With `after`/`before` the page is located by keyset instead of OFFSET.
+    Page sizes are capped at MAX_PAGE_SIZE.
+    """
+    if not page_size:
+        page_size = settings.GRAPHENE.get("PAGE_SIZE", 10)
+    page_size = min(page_size, settings.GRAPHENE.get("MAX_PAGE_SIZE", 100))
+
+    selected = set()
+    for field_ast in info.field_asts:
+        selected |= get_selected_fields(field_ast.selection_set, info.fragments)
+
+    if isinstance(query_data, Partition):
+        if not (after or before or page not in (None, 1) or selected & {"total", "size"}):
+            return resolve_partition(query_data, info, selected, page_size)
+        query_data = query_data.get_queryset()
+
+    if after or before:
+        return resolve_keyset(query_data, info, selected, page_size, after, before)
+
+    if _has_cursors(info) and isinstance(query_data, QuerySet):
+        # same total ordering as keyset pages so cursors taken here line up
+        query_data = query_data.order_by(
+            *_order_terms(get_ordering_keys(query_data))
         )
 
-        return result
+    try:
+        page = max(int(page), 1)
+    except (TypeError, ValueError):
+        page = 1
+
+    count = None
+    if selected & {"total", "size"}:
+        count = _count(query_data)
+        page = min(page, _num_pages(count, page_size))
+
+    rows = _slice(query_data, page, page_size)
+
+    if not rows and page > 1 and count is None:
+        # out of range page, fall back to the last one like Paginator did
+        count = _count(query_data)
+        page = min(page, _num_pages(count, page_size))
+        rows = _slice(query_data, page, page_size)
+
+    results = rows[:page_size]
+    return info.return_type.graphene_type(
+        total=_num_pages(count, page_size) if count is not None else None,
+        size=count,
+        current=page,
+        has_next=len(rows) > page_size,
+        has_prev=page > 1,
+        results=results,
+        **_cursors(query_data, selected, results),
+        **_facets(query_data, selected),
+    )
+
+
+def resolve_keyset(query_data, info, selected, page_size, after=None, before=None):
+    """
+    Seek to the rows after (or before) a cursor using the queryset ordering.
+
+    The ordering is made total by appending the primary key, so the lookup
+    is a plain range condition that an index on the ordering columns can
+    serve at any depth.
+    """
+    backwards = not after
+    results, has_more = keyset_page(query_data, after or before, page_size, backwards)
+
+    count = _count(query_data) if selected & {"total", "size"} else None
+    return info.return_type.graphene_type(
+        total=_num_pages(count, page_size) if count is not None else None,
+        size=count,
+        current=None,
+        has_next=True if backwards else has_more,
+        has_prev=has_more if backwards else True,
+        results=results,
+        **_cursors(query_data, selected, results),
+        **_facets(query_data, selected),
+    )
+
+
+def resolve_partition(partition, info, selected, page_size):
+    """First page of a partition, batched with its siblings through a loader."""
+    keys = get_ordering_keys(partition.queryset)
+    queryset = partition.queryset.order_by(*_order_terms(keys))
+    order_by = [OrderBy(F(name), descending=descending) for name, descending in keys]
+    loader = get_page_loader(
+        info.context, queryset, partition.field, page_size + 1, order_by
+    )
+
+    def build(rows):
+        results = rows[:page_size]
+        return info.return_type.graphene_type(
+            current=1,
+            has_next=len(rows) > page_size,
+            has_prev=False,
+            results=results,
+            **_cursors(partition.get_queryset(), selected, results),
+        )
+
+    return loader.load(partition.value).then(build)
+
+
+def keyset_page(qs, cursor, page_size, backwards=False) -> tuple:
+    """Rows following `cursor` in `qs` order and whether more rows remain."""
+    keys = get_ordering_keys(qs)
+    values = decode_cursor(cursor, qs, keys)
+
+    qs = qs.filter(_keyset_filter(keys, values, backwards))
+    qs = qs.order_by(*_order_terms(keys, reverse=backwards))
+    rows = list(qs[: page_size + 1])
+    results = rows[:page_size]
+    if backwards:
+        results.reverse()
+    return results, len(rows) > page_size
+
+
+def get_ordering_keys(qs) -> list:
+    """`(lookup, descending)` pairs of the queryset ordering, ending with pk."""
+    ordering = list(qs.query.order_by)
+    if not ordering and qs.query.default_ordering:
+        ordering = list(qs.model._meta.ordering)
+
+    pk_name = qs.model._meta.pk.name
+    keys = []
+    for term in ordering:
+        if not isinstance(term, str) or term == "?":
+            raise Exception(f"cursor pagination does not support ordering by {term}")
+        name = term.lstrip("-")
+        keys.append((pk_name if name == "pk" else name, term.startswith("-")))
+
+    if pk_name not in [name for name, _ in keys]:
+        keys.append((pk_name, keys[0][1] if keys else False))
+    return keys
+
+
+def encode_cursor(obj, qs, keys) -> str:
+    values = [_encode_value(_key_value(obj, qs, name)) for name, _ in keys]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, qs, keys) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise Exception(f"invalid cursor - {cursor}")
+
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise Exception(f"cursor does not match the current ordering - {cursor}")
+
+    decoded = []
+    for (name, _), value in zip(keys, values):
+        field = _key_field(qs, name)
+        decoded.append(field.to_python(value) if field is not None else value)
+    return decoded
+
+
+def _has_cursors(info) -> bool:
+    return "after" in info.return_type.graphene_type._meta.fields
+
+
+def _cursors(query_data, selected, results) -> dict:
+    if not selected & {"after", "before"} or not isinstance(query_data, QuerySet):
+        return {}
+
+    keys = get_ordering_keys(query_data)
+    return {
+        "after": encode_cursor(results[-1], query_data, keys) if results else None,
+        "before": encode_cursor(results[0], query_data, keys) if results else None,
+    }
+
+
+def _facets(query_data, selected) -> dict:
+    if "facets" not in selected or not isinstance(query_data, QuerySet):
+        return {}
+    return {"facets": query_data}
+
+
+def _keyset_filter(keys, values, backwards) -> Q:
+    # (a, b, c) > (x, y, z) expanded per column so mixed directions work,
+    # plus a redundant bound on the leading column so the planner can use
+    # an index range scan instead of filtering the whole OR
+    condition = Q()
+    for i, (name, descending) in enumerate(keys):
+        lookup = "lt" if descending != backwards else "gt"
+        equal = {keys[j][0]: values[j] for j in range(i)}
+        condition |= Q(**equal, **{f"{name}__{lookup}": values[i]})
+
+    name, descending = keys[0]
+    lookup = "lte" if descending != backwards else "gte"
+    return Q(**{f"{name}__{lookup}": values[0]}) & condition
+
+
+def _order_terms(keys, reverse=False) -> list:
+    return [f"-{name}" if descending != reverse else name for name, descending in keys]
+
+
+def _key_field(qs, name):
+    if name in qs.query.annotations:
+        return None
+
+    model, field = qs.model, None
+    for part in name.split("__"):
+        field = model._meta.get_field(part)
+        model = field.related_model
+    if field.is_relation:
+        return field.target_field
+    return field
+
+
+def _key_value(obj, qs, name):
+    if name in qs.query.annotations:
+        return getattr(obj, name)
+
+    *path, last = name.split("__")
+    for part in path:
+        obj = getattr(obj, part)
+    field = obj._meta.get_field(last)
+    return getattr(obj, field.attname)
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def _count(query_data) -> int:
+    if isinstance(query_data, QuerySet):
+        return query_data.count()
+    return len(query_data)
+
+
+def _num_pages(count, page_size) -> int:
+    return max(-(-count // page_size), 1)
+
 
-    return get_paginated_data(query_data, info.return_type, page, page_size)
+def _slice(query_data, page, page_size) -> list:
+    offset = (page - 1) * page_size
+    return list(query_data[offset : offset + page_size + 1])
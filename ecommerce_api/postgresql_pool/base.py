@@ -0,0 +1,116 @@
+"""
+PostgreSQL backend taking its connections from a pool of the process.
+
+    'ENGINE': 'ecommerce_api.postgresql_pool',
+    'CONN_MAX_AGE': 0,
+    'POOL': {'MIN_SIZE': 1, 'MAX_SIZE': 4, ...},
+
+Closing the connection at the end of a request returns it to the pool
+instead of disconnecting, so with CONN_MAX_AGE 0 the threads of a worker
+share at most MAX_SIZE connections and a request rarely pays for the
+handshake. Pools are per process, alias and connection parameters, a
+forked worker starts its own.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from .creation import DatabaseCreation
+from .pool import ConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def check(connection):
+    """Raises when a pooled connection no longer answers."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+def get_pool(alias: str, conn_params: dict, config: dict) -> ConnectionPool:
+    key = (os.getpid(), alias, tuple(sorted((k, str(v)) for k, v in conn_params.items())))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(
+                    lambda: base.Database.connect(**conn_params),
+                    min_size=config.get("MIN_SIZE", 0),
+                    max_size=config.get("MAX_SIZE", 10),
+                    timeout=config.get("TIMEOUT", 10),
+                    max_idle=config.get("MAX_IDLE", 300),
+                    max_lifetime=config.get("MAX_LIFETIME", 3600),
+                    check_after=config.get("CHECK_AFTER", 30),
+                    check=check,
+                )
+                pool.fill()
+                _pools[key] = pool
+    return pool
+
+
+def close_pools(database: str = None, alias: str = None):
+    """Closes the pools of this process, those of `database` or `alias` only if given."""
+    with _pools_lock:
+        for key, pool in list(_pools.items()):
+            pid, pool_alias, params = key
+            if (
+                pid == os.getpid()
+                and (database is None or ("database", database) in params)
+                and (alias is None or alias == pool_alias)
+            ):
+                pool.close()
+                del _pools[key]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, conn_params, self.settings_dict.get("POOL", {}))
+        connection = self.pool.getconn()
+
+        # as the psycopg2 backend, on a reused connection too
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.pool is None:
+            return super()._close()
+
+        connection = self.connection
+        # django keeps a connection closed inside an atomic block, another
+        # thread must not get it; a broken one is not worth keeping either
+        discard = self.in_atomic_block or connection.closed
+        if not discard:
+            status = connection.get_transaction_status()
+            if status in (
+                extensions.TRANSACTION_STATUS_INTRANS,
+                extensions.TRANSACTION_STATUS_INERROR,
+            ):
+                try:
+                    connection.rollback()
+                except base.Database.Error:
+                    discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                discard = True
+        self.pool.putconn(connection, discard=discard)
+
+    def pool_stats(self):
+        return self.pool.stats() if self.pool is not None else None
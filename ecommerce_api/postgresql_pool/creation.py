@@ -0,0 +1,17 @@
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseDatabaseCreation
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+    """Idle pooled connections would keep a test database from being dropped or cloned."""
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        from .base import close_pools
+
+        close_pools(self.connection.settings_dict["NAME"])
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        from .base import close_pools
+
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of DB-API connections shared by the threads of a process.
+
+    At most `max_size` connections are open, a checkout waits up to
+    `timeout` seconds for one to be returned and raises PoolTimeout after.
+    Idle connections are reused most recently returned first, those idle
+    longer than `max_idle` are closed down to `min_size`. A connection
+    older than `max_lifetime` is closed instead of reused. On checkout, a
+    connection idle for `check_after` seconds or more goes through `check`,
+    which raises when it is unusable, and is replaced then.
+    """
+
+    def __init__(
+        self,
+        connect: Callable,
+        min_size: int = 0,
+        max_size: int = 10,
+        timeout: float = 10.0,
+        max_idle: Optional[float] = 300.0,
+        max_lifetime: Optional[float] = 3600.0,
+        check_after: Optional[float] = 30.0,
+        check: Optional[Callable] = None,
+    ):
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.check = check
+        self.closed = False
+        self.metrics = {
+            "opened": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "failed_checks": 0,
+            "max_in_use": 0,
+        }
+        # (connection, returned at) of the idle connections, newest last
+        self._idle = deque()
+        self._opened_at = {}
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def fill(self):
+        """Opens connections up to min_size."""
+        with self._cond:
+            missing = max(self.min_size - self._size, 0)
+            self._size += missing
+        for _ in range(missing):
+            try:
+                connection = self._open()
+            except Exception:
+                self._release_slot()
+                raise
+            self.putconn(connection)
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            connection, returned = self._checkout(deadline)
+            if connection is None:
+                try:
+                    connection = self._open()
+                except Exception:
+                    self._release_slot()
+                    raise
+            elif not self._usable(connection, returned):
+                self._discard(connection)
+                continue
+
+            with self._cond:
+                self.metrics["checkouts"] += 1
+                in_use = self._size - len(self._idle)
+                self.metrics["max_in_use"] = max(self.metrics["max_in_use"], in_use)
+            return connection
+
+    def putconn(self, connection, discard: bool = False):
+        if discard or self.closed or self._expired(connection):
+            self._discard(connection)
+            return
+
+        now = time.monotonic()
+        stale = []
+        with self._cond:
+            self._idle.append((connection, now))
+            if self.max_idle is not None:
+                while len(self._idle) > 1 and self._size > self.min_size:
+                    oldest, returned = self._idle[0]
+                    if now - returned < self.max_idle:
+                        break
+                    self._idle.popleft()
+                    stale.append(oldest)
+            self._cond.notify()
+        for connection in stale:
+            self._discard(connection)
+
+    def close(self):
+        """Closes the idle connections, those in use are when returned."""
+        with self._cond:
+            self.closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self) -> dict:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                **self.metrics,
+                "wait_time": round(self.metrics["wait_time"], 6),
+            }
+
+    def _checkout(self, deadline: float):
+        """
+        `(connection, returned at)` of an idle connection, `(None, None)`
+        when a slot for a new one was taken.
+        """
+        with self._cond:
+            started = None
+            try:
+                while True:
+                    if self.closed:
+                        raise PoolTimeout("connection pool is closed")
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None, None
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.metrics["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"no connection available within {self.timeout}s, "
+                            f"{self.max_size} in use"
+                        )
+                    if started is None:
+                        started = time.monotonic()
+                        self.metrics["waits"] += 1
+                    self._cond.wait(remaining)
+            finally:
+                if started is not None:
+                    self.metrics["wait_time"] += time.monotonic() - started
+
+    def _open(self):
+        connection = self.connect()
+        with self._cond:
+            self._opened_at[id(connection)] = time.monotonic()
+            self.metrics["opened"] += 1
+        return connection
+
+    def _usable(self, connection, returned: float) -> bool:
+        if getattr(connection, "closed", False) or self._expired(connection):
+            return False
+        if self.check is None or self.check_after is None:
+            return True
+        # a connection just returned was fine a moment ago
+        if time.monotonic() - returned < self.check_after:
+            return True
+        try:
+            self.check(connection)
+        except Exception:
+            with self._cond:
+                self.metrics["failed_checks"] += 1
+            return False
+        return True
+
+    def _expired(self, connection) -> bool:
+        if self.max_lifetime is None:
+            return False
+        opened_at = self._opened_at.get(id(connection), time.monotonic())
+        return time.monotonic() - opened_at >= self.max_lifetime
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._opened_at.pop(id(connection), None)
+            self.metrics["closed"] += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
@@ -0,0 +1,136 @@
+import json
+import logging
+import re
+import time
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger("ecommerce_api.profiling")
+
+# path of the queries run while no resolver is, i.e. DataLoader batches
+BATCHED = "(batched)"
+
+# literals and IN lists differ between otherwise identical queries
+_SHAPE_PATTERNS = (
+    (re.compile(r"\bIN \((?:%s, )*%s\)"), "IN (...)"),
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+\b"), "?"),
+)
+
+
+def sql_shape(sql: str) -> str:
+    for pattern, replacement in _SHAPE_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class RequestProfile(object):
+    """
+    Resolver and SQL timings of one GraphQL request.
+
+    Resolvers are aggregated by path with the list indexes left out, so
+    `products.results.category` is one entry whatever the page size. A SQL
+    query is charged to the resolver running when it executes. DataLoader
+    batches run once pending promises settle, often inside an enclosing
+    root field and otherwise under BATCHED.
+    """
+
+    def __init__(self, n_plus_one_threshold: int = 5, top: int = 20):
+        self.threshold = n_plus_one_threshold
+        self.top = top
+        self.started = time.perf_counter()
+        self.duration = None
+        self.resolvers = {}
+        self.shapes = {}
+        self.stack = []
+        self.queries = 0
+        self.sql_time = 0.0
+
+    def enter(self, path: str):
+        self.stack.append(path)
+
+    def exit(self, path: str, elapsed: float):
+        self.stack.pop()
+        entry = self.resolvers.setdefault(path, _entry())
+        entry["calls"] += 1
+        entry["time"] += elapsed
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            path = self.stack[-1] if self.stack else BATCHED
+            self.queries += 1
+            self.sql_time += elapsed
+
+            entry = self.resolvers.setdefault(path, _entry())
+            entry["queries"] += 1
+            entry["sql_time"] += elapsed
+
+            shape = self.shapes.setdefault(sql_shape(sql), {"count": 0, "paths": set()})
+            shape["count"] += 1
+            shape["paths"].add(path)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def report(self) -> dict:
+        resolvers = sorted(self.resolvers.items(), key=lambda item: -item[1]["time"])
+        return {
+            "duration_ms": _ms(self.duration or time.perf_counter() - self.started),
+            "queries": self.queries,
+            "sql_ms": _ms(self.sql_time),
+            "resolvers": [
+                {
+                    "path": path,
+                    "calls": entry["calls"],
+                    "ms": _ms(entry["time"]),
+                    "queries": entry["queries"],
+                    "sql_ms": _ms(entry["sql_time"]),
+                }
+                for path, entry in resolvers[: self.top]
+            ],
+            "n_plus_one": [
+                {"sql": sql, "count": shape["count"], "paths": sorted(shape["paths"])}
+                for sql, shape in self.shapes.items()
+                if shape["count"] > self.threshold
+            ],
+        }
+
+
+class Profiler(object):
+    """Settings of the profiling and where a report goes."""
+
+    def __init__(self, config: Optional[dict] = None):
+        if config is None:
+            config = getattr(settings, "GRAPHQL_PROFILING", {})
+        self.enabled = config.get("ENABLED", False)
+        self.n_plus_one_threshold = config.get("N_PLUS_ONE_THRESHOLD", 5)
+        self.top = config.get("TOP", 20)
+
+    def start(self) -> RequestProfile:
+        return RequestProfile(self.n_plus_one_threshold, self.top)
+
+    def publish(self, request, profile: RequestProfile) -> Optional[dict]:
+        """The report in DEBUG, to be returned in extensions, logged otherwise."""
+        report = profile.report()
+        if settings.DEBUG:
+            return report
+        logger.info(
+            json.dumps({"event": "graphql.profile", "path": request.path, **report})
+        )
+        return None
+
+
+def _entry() -> dict:
+    return {"calls": 0, "time": 0.0, "queries": 0, "sql_time": 0.0}
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+profiler = Profiler()
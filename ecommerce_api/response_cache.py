@@ -0,0 +1,211 @@
+import hashlib
+import json
+import threading
+import time
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql.language import ast
+from graphql.language.printer import print_ast
+
+from .documents import document_backend
+
+# fields whose value depends on who asks, or that expose another user's
+# activity, an operation selecting any of them is never cached. The
+# relations of UserType are added by private_fields()
+PRIVATE_FIELDS = frozenset(
+    {
+        "me",
+        "orders",
+        "businessOrders",
+        "productCarts",
+        "productsWished",
+        "productOrderLines",
+    }
+)
+
+
+@lru_cache(maxsize=None)
+def private_fields() -> frozenset:
+    """PRIVATE_FIELDS and every relation of a user, from the schema."""
+    from graphene import Dynamic
+    from graphene.utils.str_converters import to_camel_case
+    from users.types import UserType
+
+    relations = {
+        to_camel_case(name)
+        for name, field in UserType._meta.fields.items()
+        if isinstance(field, Dynamic)
+    }
+    return PRIVATE_FIELDS | relations
+
+
+class ResponseCache(object):
+    """
+    Whole GraphQL responses of anonymous catalog queries.
+
+    An entry is keyed by the printed query document, the operation name and
+    the variables, plus the current version of every tag. A tag is a model
+    label whose version products/signals.py bumps after each committed
+    write, so a write makes every entry unreachable instead of deleting it
+    and the stale entries age out of the cache by their TTL.
+    """
+
+    key_prefix = "graphql:response"
+
+    def __init__(self, config: Optional[dict] = None):
+        if config is None:
+            config = getattr(settings, "RESPONSE_CACHE", {})
+        # disabled when empty
+        self.alias = config.get("ALIAS")
+        self.ttl = config.get("TTL", 60)
+        # root fields that may be cached, and their TTL when not the default
+        self.field_ttls = config.get("FIELDS", {})
+        self.tags = tuple(config.get("TAGS", ()))
+        self._counts = {"hits": 0, "misses": 0, "bypasses": 0, "stores": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.alias)
+
+    def lookup(
+        self, request, query, variables, operation_name
+    ) -> Tuple[Optional[str], Optional[str], int]:
+        """`(key, cached body, ttl)` of a request, no key when it can't be cached."""
+        document, ttl = self.check(request, query, operation_name)
+        if document is None:
+            self._count("bypasses")
+            return None, None, 0
+
+        key = self.make_key(document, variables, operation_name)
+        body = self.shared.get(key)
+        self._count("hits" if body is not None else "misses")
+        return key, body, ttl
+
+    def store(self, key: str, body: str, ttl: int):
+        self.shared.set(key, body, ttl)
+        self._count("stores")
+
+    def check(self, request, query, operation_name) -> tuple:
+        """The parsed document and TTL of a cacheable request, `(None, 0)` otherwise."""
+        if not self.enabled or not query or request.headers.get("AUTHORIZATION"):
+            return None, 0
+
+        try:
+            document = document_backend.parse(query)
+        except Exception:
+            return None, 0
+
+        operation = _get_operation(document, operation_name)
+        if operation is None or operation.operation != "query":
+            return None, 0
+
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+        roots = _field_names(operation.selection_set, fragments, deep=False)
+        if not roots or not roots <= set(self.field_ttls):
+            return None, 0
+        if _field_names(operation.selection_set, fragments, deep=True) & private_fields():
+            return None, 0
+
+        return document, min(self.field_ttls[name] or self.ttl for name in roots)
+
+    def make_key(self, document, variables, operation_name) -> str:
+        # printing normalizes whitespace, commas and comments away
+        digest = hashlib.sha256(
+            json.dumps(
+                [print_ast(document), operation_name, variables or {}],
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+        versions = ".".join(str(version) for version in self._versions())
+        return f"{self.key_prefix}:{digest}:{versions}"
+
+    def invalidate(self, tag: str):
+        if not self.enabled or tag not in self.tags:
+            return
+        try:
+            self.shared.incr(self._version_key(tag))
+        except ValueError:
+            self._versions()
+
+    def clear(self):
+        with self._lock:
+            for name in self._counts:
+                self._counts[name] = 0
+        for tag in self.tags:
+            self.invalidate(tag)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counts)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _versions(self) -> list:
+        keys = [self._version_key(tag) for tag in self.tags]
+        versions = self.shared.get_many(keys)
+        missing = [key for key in keys if key not in versions]
+        if missing:
+            # like the category cache, a version lost to eviction must not
+            # restart at a number older entries were stored under
+            seed = int(time.time() * 1000)
+            for key in missing:
+                self.shared.add(key, seed, None)
+            versions.update(self.shared.get_many(missing))
+        return [versions.get(key) for key in keys]
+
+    def _version_key(self, tag: str) -> str:
+        return f"{self.key_prefix}:version:{tag}"
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+
+def _get_operation(document, operation_name):
+    operations = [
+        definition
+        for definition in document.definitions
+        if isinstance(definition, ast.OperationDefinition)
+    ]
+    if operation_name:
+        for operation in operations:
+            if operation.name and operation.name.value == operation_name:
+                return operation
+        return None
+    return operations[0] if len(operations) == 1 else None
+
+
+def _field_names(selection_set, fragments, deep) -> set:
+    names = set()
+    if selection_set is None:
+        return names
+
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            names.add(selection.name.value)
+            if deep:
+                names |= _field_names(selection.selection_set, fragments, deep)
+        elif isinstance(selection, ast.FragmentSpread):
+            fragment = fragments.get(selection.name.value)
+            if fragment is not None:
+                names |= _field_names(fragment.selection_set, fragments, deep)
+        elif isinstance(selection, ast.InlineFragment):
+            names |= _field_names(selection.selection_set, fragments, deep)
+    return names
+
+
+response_cache = ResponseCache()
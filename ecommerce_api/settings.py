@@ -24,7 +24,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = config('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = config('DEBUG')
+DEBUG = config('DEBUG', cast=bool)
 
 ALLOWED_HOSTS = ['*']
 
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # apps
     'graphene_django',
     'users',
@@ -86,12 +87,28 @@ DB_PORT = config("DB_PORT")
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        # django.db.backends.postgresql_psycopg2 connects per thread instead
+        'ENGINE': config('DB_ENGINE', default='ecommerce_api.postgresql_pool'),
         'NAME': DB_NAME,
         'USER': DB_USER,
         'PASSWORD': DB_PASSWORD,
         'HOST': DB_HOST,
         'PORT': DB_PORT,
+        # seconds a thread keeps its connection across requests, 0 gives it
+        # back after each request. With the pool, connections outlive that,
+        # and a thread holding one across requests keeps it from the others.
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+        # connections of the pool of each process, see
+        # ecommerce_api/postgresql_pool. Idle ones are checked with a
+        # SELECT 1 after CHECK_AFTER seconds, checkouts wait TIMEOUT seconds
+        'POOL': {
+            'MIN_SIZE': config('DB_POOL_MIN_SIZE', default=1, cast=int),
+            'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=4, cast=int),
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            'MAX_IDLE': config('DB_POOL_MAX_IDLE', default=300, cast=int),
+            'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=3600, cast=int),
+            'CHECK_AFTER': config('DB_POOL_CHECK_AFTER', default=30, cast=int),
+        },
     }
 }
 
@@ -130,11 +147,126 @@ STATIC_URL = '/static/'
 
 AUTH_USER_MODEL = "users.User"
 
+# per resolver timings and SQL of each request, returned in the response
+# extensions with DEBUG and logged by ecommerce_api.profiling otherwise.
+# Off by default, the middleware is not even installed then. An SQL shape
+# repeated more than N_PLUS_ONE_THRESHOLD times is reported as N+1
+GRAPHQL_PROFILING = {
+    'ENABLED': config('GRAPHQL_PROFILING', default=False, cast=bool),
+    'N_PLUS_ONE_THRESHOLD': config('GRAPHQL_PROFILING_N_PLUS_ONE', default=5, cast=int),
+    'TOP': config('GRAPHQL_PROFILING_TOP', default=20, cast=int),
+}
+
 GRAPHENE = {
     'SCHEMA': 'ecommerce_api.schema.schema',
     'MIDDLEWARE': [
         'ecommerce_api.middlewares.CustomAuthMiddleware',
         'ecommerce_api.middlewares.CustomPaginationMiddleware',
+        # last, so it wraps the others
+        *(
+            ['ecommerce_api.middlewares.ProfilingMiddleware']
+            if GRAPHQL_PROFILING['ENABLED']
+            else []
+        ),
     ],
     'PAGE_SIZE': 1,
+    # upper bound of pageSize and first, larger values are capped
+    'MAX_PAGE_SIZE': config('MAX_PAGE_SIZE', default=100, cast=int),
+}
+
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=4096, cast=int)
+
+AUTH_USER_CACHE = {
+    'LOCAL_SIZE': config('AUTH_USER_CACHE_LOCAL_SIZE', default=1024, cast=int),
+    'LOCAL_TTL': config('AUTH_USER_CACHE_LOCAL_TTL', default=30, cast=int),
+    # django cache alias for the shared tier, disabled when empty
+    'SHARED_ALIAS': config('AUTH_USER_CACHE_SHARED_ALIAS', default=None),
+    'SHARED_TTL': config('AUTH_USER_CACHE_SHARED_TTL', default=300, cast=int),
+}
+
+# "database" searches with postgres full-text search (icontains on other
+# backends), "memory" with the per-process inverted index
+PRODUCT_SEARCH_BACKEND = config('PRODUCT_SEARCH_BACKEND', default='database')
+PRODUCT_SEARCH_INDEX_REFRESH = config('PRODUCT_SEARCH_INDEX_REFRESH', default=60, cast=int)
+
+# memcached shared by every process when CACHE_LOCATION is set. The memory
+# cache otherwise is private to a process, writes are then not seen by the
+# other workers: `manage.py check --deploy` refuses it
+CACHE_LOCATION = config('CACHE_LOCATION', default=None)
+
+CACHES = {
+    'default': {
+        'BACKEND': (
+            'django.core.cache.backends.memcached.MemcachedCache'
+            if CACHE_LOCATION
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': CACHE_LOCATION or '',
+    }
+}
+
+# django cache alias and TTL of the category listing
+CATEGORY_CACHE = {
+    'ALIAS': config('CATEGORY_CACHE_ALIAS', default='default'),
+    'TTL': config('CATEGORY_CACHE_TTL', default=3600, cast=int),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        'ecommerce_api': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# parsed and validated query documents kept per process
+GRAPHQL_DOCUMENT_CACHE_SIZE = config('GRAPHQL_DOCUMENT_CACHE_SIZE', default=512, cast=int)
+
+# static cost and depth budgets of an operation, see ecommerce_api/complexity.py.
+# LIST_SIZE is the size assumed for unpaginated relation lists, FIELD_COSTS
+# overrides the cost of "Type.field"
+QUERY_COST = {
+    'MAX_COST': config('QUERY_MAX_COST', default=20000, cast=int),
+    'MAX_DEPTH': config('QUERY_MAX_DEPTH', default=10, cast=int),
+    'LIST_SIZE': config('QUERY_LIST_SIZE', default=20, cast=int),
+    'FIELD_COSTS': {
+        # a GROUP BY over every matching product
+        'ProductFacetsType.categories': 50,
+        'ProductFacetsType.businesses': 50,
+        'ProductFacetsType.prices': 50,
+    },
 }
+
+# automatic persisted queries, registered query strings by SHA-256
+PERSISTED_QUERIES = {
+    'ALIAS': config('PERSISTED_QUERIES_ALIAS', default='default'),
+    'TTL': config('PERSISTED_QUERIES_TTL', default=86400, cast=int),
+    'LOCAL_SIZE': config('PERSISTED_QUERIES_LOCAL_SIZE', default=1024, cast=int),
+}
+
+# whole responses of anonymous catalog queries, disabled without a django
+# cache alias. FIELDS are the cacheable root fields with their TTL (None for
+# the default), TAGS the models whose committed writes invalidate entries.
+# Availability changes made by carts only show after the TTL.
+RESPONSE_CACHE = {
+    'ALIAS': config('RESPONSE_CACHE_ALIAS', default=None),
+    'TTL': config('RESPONSE_CACHE_TTL', default=60, cast=int),
+    'FIELDS': {
+        'products': None,
+        'product': None,
+        'categories': config('RESPONSE_CACHE_CATEGORIES_TTL', default=300, cast=int),
+    },
+    'TAGS': (
+        'products.Product',
+        'products.Category',
+        'products.Business',
+        'products.ProductImage',
+        'products.ProductComment',
+    ),
+}
+
+# seconds a cart holds its units, and how many expired holds the reaper
+# releases per transaction
+RESERVATION_TTL = config('RESERVATION_TTL', default=900, cast=int)
+RESERVATION_REAP_BATCH = config('RESERVATION_REAP_BATCH', default=500, cast=int)
@@ -0,0 +1,570 @@
+import json
+import threading
+from unittest import mock, skipUnless
+
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphene_django import views as graphene_views
+
+from users.models import User
+
+from .auth import TokenManager, UserCache, token_cache, user_cache
+from .complexity import query_cost
+from .documents import document_backend, persisted_queries, query_hash
+from .middlewares import ProfilingMiddleware
+from .postgresql_pool.pool import ConnectionPool, PoolTimeout
+from .profiling import RequestProfile, profiler
+
+
+class CustomAuthMiddlewareTest(TestCase):
+    users_query = """
+        query {
+            users(pageSize: %d) {
+                results { id email firstName lastName isActive createdAt }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "owner@example.com", "password", first_name="a", last_name="b"
+        )
+        for i in range(30):
+            User.objects.create_user(
+                f"user{i}@example.com", "password", first_name="a", last_name="b"
+            )
+        token = TokenManager.get_access({"user_id": self.user.id})
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {token}"}
+
+    def execute(self, query):
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                "/graphview/",
+                json.dumps({"query": query}),
+                content_type="application/json",
+                **self.headers,
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("errors", response.json())
+        lookup = f'"users_user"."id" = {self.user.id}'
+        return [q["sql"] for q in ctx.captured_queries if lookup in q["sql"]]
+
+    def test_single_user_lookup_regardless_of_response_size(self):
+        self.assertEqual(len(self.execute(self.users_query % 1)), 1)
+        self.assertEqual(len(self.execute(self.users_query % 30)), 1)
+
+    def test_single_user_lookup_for_multiple_root_fields(self):
+        query = "query { me { id email } users(pageSize: 5) { results { id } } }"
+        self.assertEqual(len(self.execute(query)), 1)
+
+
+# invalidation runs on commit, which TestCase never reaches
+class UserCacheTest(TransactionTestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(
+            "cached@example.com", "password", first_name="a", last_name="b"
+        )
+        token = TokenManager.get_access({"user_id": self.user.id})
+        self.headers = {"HTTP_AUTHORIZATION": f"JWT {token}"}
+
+    def me(self):
+        response = self.client.post(
+            "/graphview/",
+            json.dumps({"query": "query { me { id email } }"}),
+            content_type="application/json",
+            **self.headers,
+        )
+        return response.json()
+
+    def test_warm_request_skips_user_lookup(self):
+        self.me()
+        with self.assertNumQueries(0):
+            data = self.me()
+        self.assertEqual(data["data"]["me"]["email"], "cached@example.com")
+        self.assertEqual(user_cache.stats()["local"]["hits"], 1)
+        self.assertEqual(user_cache.stats()["local"]["misses"], 1)
+
+    def test_save_invalidates(self):
+        self.me()
+        self.user.email = "renamed@example.com"
+        self.user.save()
+        self.assertEqual(self.me()["data"]["me"]["email"], "renamed@example.com")
+
+    def test_deactivation_rejects_cached_user(self):
+        self.me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.me()["data"]["me"])
+
+    def test_deactivation_in_transaction(self):
+        self.me()
+        with transaction.atomic():
+            self.user.is_active = False
+            self.user.save()
+            # other requests still see the committed row until the commit
+            self.assertIsNotNone(user_cache.local.get(self.user.id))
+        self.assertIsNone(user_cache.local.get(self.user.id))
+        self.assertIsNone(self.me()["data"]["me"])
+
+    def test_shared_tier(self):
+        cache = UserCache({"SHARED_ALIAS": "default"})
+        cache.shared.clear()
+        self.assertEqual(cache.get(self.user.id).email, self.user.email)
+        cache.local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get(self.user.id).pk, self.user.pk)
+        self.assertEqual(cache.stats()["shared"], {"hits": 1, "misses": 1})
+
+        cache.invalidate(self.user.id)
+        with self.assertNumQueries(1):
+            cache.get(self.user.id)
+        self.assertEqual(cache.stats()["shared"]["misses"], 2)
+
+
+class TokenCacheTest(TestCase):
+    def setUp(self):
+        token_cache.clear()
+
+    def test_warm_decode_skips_verification(self):
+        token = TokenManager.get_access({"user_id": 1})
+        self.assertEqual(TokenManager.decode_token(token)["user_id"], 1)
+        with mock.patch("ecommerce_api.auth.jwt.decode") as decode:
+            self.assertEqual(TokenManager.decode_token(token)["user_id"], 1)
+        decode.assert_not_called()
+        self.assertEqual(token_cache.stats()["hits"], 1)
+
+    def test_entry_evicted_at_exp(self):
+        token = TokenManager.get_token(1, {"user_id": 1})
+        decoded = TokenManager.decode_token(token)
+        self.assertEqual(len(token_cache), 1)
+
+        with mock.patch("ecommerce_api.auth.datetime") as dt:
+            dt.now.return_value.timestamp.return_value = decoded["exp"] + 1
+            self.assertIsNone(TokenManager.decode_token(token))
+        self.assertEqual(len(token_cache), 0)
+
+    def test_invalid_token_not_cached(self):
+        token = TokenManager.get_access({"user_id": 1})
+        self.assertIsNone(TokenManager.decode_token(token[:-2] + "xx"))
+        self.assertIsNone(TokenManager.decode_token("garbage"))
+        self.assertEqual(len(token_cache), 0)
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        for i in range(7):
+            User.objects.create_user(
+                f"page{i}@example.com", "password", first_name="a", last_name="b"
+            )
+
+    def execute(self, query):
+        response = self.client.post(
+            "/graphview/", json.dumps({"query": query}), content_type="application/json"
+        )
+        return response.json()
+
+    def users(self, selection, page=1, page_size=3):
+        query = "query { users(page: %d, pageSize: %d) { %s } }" % (
+            page,
+            page_size,
+            selection,
+        )
+        return self.execute(query)["data"]["users"]
+
+    def test_count_skipped_when_not_selected(self):
+        with self.assertNumQueries(1):
+            data = self.users("current hasNext hasPrev results { id }", page=2)
+        self.assertEqual(data["current"], 2)
+        self.assertTrue(data["hasNext"])
+        self.assertTrue(data["hasPrev"])
+        self.assertEqual(len(data["results"]), 3)
+
+    def test_single_count_for_total_and_size(self):
+        with self.assertNumQueries(2):
+            data = self.users("total size hasNext results { id }", page=3)
+        self.assertEqual((data["total"], data["size"]), (3, 7))
+        self.assertFalse(data["hasNext"])
+        self.assertEqual(len(data["results"]), 1)
+
+    def test_count_through_fragment(self):
+        query = """
+            query { users(pageSize: 3) { ...PageInfo results { id } } }
+            fragment PageInfo on UserTypePaginated { size }
+        """
+        with self.assertNumQueries(2):
+            data = self.execute(query)
+        self.assertEqual(data["data"]["users"]["size"], 7)
+
+    def test_out_of_range_page_falls_back_to_last(self):
+        data = self.users("current hasNext results { id }", page=10)
+        self.assertEqual(data["current"], 3)
+        self.assertFalse(data["hasNext"])
+        self.assertEqual(len(data["results"]), 1)
+
+
+class DocumentCacheTest(TestCase):
+    query = "query { categories { name } }"
+
+    def setUp(self):
+        document_backend.clear()
+
+    def post(self, body):
+        response = self.client.post(
+            "/graphview/", json.dumps(body), content_type="application/json"
+        )
+        return response.status_code, response.json()
+
+    def test_parsed_and_validated_once(self):
+        with mock.patch("ecommerce_api.documents.validate", return_value=[]) as validate:
+            for _ in range(3):
+                status, data = self.post({"query": self.query})
+                self.assertEqual((status, data["data"]), (200, {"categories": []}))
+        self.assertEqual(validate.call_count, 1)
+        self.assertEqual(document_backend.stats()["validated"]["hits"], 2)
+
+    def test_invalid_document_cached_with_its_errors(self):
+        for _ in range(2):
+            status, data = self.post({"query": "query { categories { nope } }"})
+            self.assertEqual(status, 400)
+            self.assertIn("nope", data["errors"][0]["message"])
+        self.assertEqual(document_backend.stats()["validated"]["size"], 1)
+
+        status, data = self.post({"query": "query { categories {"})
+        self.assertEqual(status, 400)
+        self.assertEqual(document_backend.stats()["parsed"]["size"], 1)
+
+
+class PersistedQueryTest(TestCase):
+    query = "query { categories { name } }"
+
+    def setUp(self):
+        persisted_queries.clear()
+        persisted_queries.shared.clear()
+
+    def post(self, digest, query=None):
+        body = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": digest}}}
+        if query is not None:
+            body["query"] = query
+        response = self.client.post(
+            "/graphview/", json.dumps(body), content_type="application/json"
+        )
+        return response.json()
+
+    def test_register_then_hash_only(self):
+        digest = query_hash(self.query)
+        self.assertEqual(
+            self.post(digest)["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND"
+        )
+        self.assertEqual(self.post(digest, self.query)["data"], {"categories": []})
+        self.assertEqual(self.post(digest)["data"], {"categories": []})
+
+        # a fresh process finds it in the shared cache
+        persisted_queries.clear()
+        self.assertEqual(self.post(digest)["data"], {"categories": []})
+
+        params = json.dumps({"persistedQuery": {"version": 1, "sha256Hash": digest}})
+        response = self.client.get("/graphview/", {"extensions": params})
+        self.assertEqual(response.json()["data"], {"categories": []})
+
+    def test_hash_mismatch_rejected(self):
+        data = self.post(query_hash("query { me { id } }"), self.query)
+        self.assertEqual(data["errors"][0]["extensions"]["code"], "BAD_REQUEST")
+        self.assertIsNone(persisted_queries.get(query_hash("query { me { id } }")))
+
+
+class QueryCostTest(TestCase):
+    def post(self, query, variables=None):
+        response = self.client.post(
+            "/graphview/",
+            json.dumps({"query": query, "variables": variables or {}}),
+            content_type="application/json",
+        )
+        return response.status_code, response.json()
+
+    def test_cost_reported_in_extensions(self):
+        query = """
+            query ($size: Int) {
+                products(pageSize: $size) { total results { name category { name } } }
+            }
+        """
+        # products, one result and one category per result
+        for size, cost in ((1, 3), (10, 21), (50, 101)):
+            status, data = self.post(query, {"size": size})
+            self.assertEqual(status, 200)
+            self.assertEqual(data["extensions"]["cost"], {"cost": cost, "depth": 4})
+
+    def test_scalar_results_paid_per_item(self):
+        query = "query { products(pageSize: 80) { results { id name } } }"
+        self.assertEqual(self.post(query)[1]["extensions"]["cost"], {"cost": 1 + 80, "depth": 3})
+
+    def test_page_size_capped(self):
+        query = "query { products(pageSize: 100000) { results { id name } } }"
+        with mock.patch.object(query_cost, "max_page_size", 100):
+            cost = self.post(query)[1]["extensions"]["cost"]
+        self.assertEqual(cost, {"cost": 1 + 100, "depth": 3})
+
+    def test_variable_defaults_applied(self):
+        query = """
+            query ($n: Int = 50) { products(pageSize: $n) { results { category { id } } } }
+        """
+        self.assertEqual(self.post(query)[1]["extensions"]["cost"]["cost"], 1 + 50 + 50)
+        # a value sent overrides the default
+        data = self.post(query, {"n": 2})[1]
+        self.assertEqual(data["extensions"]["cost"]["cost"], 1 + 2 + 2)
+
+    def test_unbounded_lists_multiply(self):
+        query = """
+            query { categories { productCategories { productImages { id } } } }
+        """
+        with mock.patch.object(query_cost, "list_size", 10):
+            data = self.post(query)[1]
+        # each list is paid once per parent it can be fetched for
+        self.assertEqual(data["extensions"]["cost"], {"cost": 1 + 10 + 100, "depth": 4})
+
+    def test_over_budget_rejected_before_execution(self):
+        query = """
+            query {
+                categories { productCategories { productCarts { user {
+                    userComments { product { name } }
+                } } } }
+            }
+        """
+        with mock.patch.object(query_cost, "max_cost", 1000), self.assertNumQueries(0):
+            status, data = self.post(query)
+        self.assertEqual(status, 400)
+        self.assertIn("exceeds the limit of 1000", data["errors"][0]["message"])
+        self.assertNotIn("data", data)
+        self.assertGreater(data["extensions"]["cost"]["cost"], 1000)
+
+        with mock.patch.object(query_cost, "max_depth", 3):
+            status, data = self.post(query)
+        self.assertIn("query depth 7 exceeds the limit of 3", data["errors"][0]["message"])
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        for i in range(8):
+            User.objects.create_user(
+                f"profiled{i}@example.com", "password", first_name="a", last_name="b"
+            )
+        patcher = mock.patch.object(profiler, "enabled", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, query):
+        middleware = [*graphene_views.graphene_settings.MIDDLEWARE, ProfilingMiddleware]
+        # the view reads its middleware from graphene's settings object
+        with mock.patch.object(graphene_views.graphene_settings, "MIDDLEWARE", middleware):
+            response = self.client.post(
+                "/graphview/", json.dumps({"query": query}), content_type="application/json"
+            )
+        return response.json()
+
+    @override_settings(DEBUG=True)
+    def test_report_in_extensions(self):
+        data = self.post("query { users(pageSize: 3) { results { email } } }")
+        profile = data["extensions"]["profile"]
+        self.assertEqual(profile["queries"], 1)
+        paths = {entry["path"]: entry for entry in profile["resolvers"]}
+        self.assertEqual(paths["users"]["queries"], 1)
+        self.assertEqual(paths["users.results.email"]["calls"], 3)
+        self.assertEqual(profile["n_plus_one"], [])
+
+    def test_n_plus_one_flagged(self):
+        profile = RequestProfile(n_plus_one_threshold=2)
+        with connection.execute_wrapper(profile.execute_wrapper):
+            for user in User.objects.order_by("pk")[:5]:
+                profile.enter("users.results.email")
+                User.objects.filter(pk__in=[user.pk, user.pk + 1]).exists()
+                User.objects.get(email=user.email)
+                profile.exit("users.results.email", 0.0)
+
+        shapes = profile.report()["n_plus_one"]
+        self.assertEqual(len(shapes), 2)
+        self.assertEqual({shape["count"] for shape in shapes}, {5})
+        self.assertEqual(shapes[0]["paths"], ["users.results.email"])
+
+    @override_settings(DEBUG=False)
+    def test_logged_in_production(self):
+        with self.assertLogs("ecommerce_api.profiling", "INFO") as logs:
+            data = self.post("query { users(pageSize: 3) { results { email } } }")
+        self.assertNotIn("profile", data["extensions"])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["event"], line["queries"]), ("graphql.profile", 1))
+
+
+class HealthCheckTest(TestCase):
+    def test_live(self):
+        response = self.client.get("/health/live/")
+        self.assertEqual((response.status_code, response.json()), (200, {"status": "ok"}))
+
+    def test_ready(self):
+        response = self.client.get("/health/ready/")
+        self.assertEqual(response.status_code, 200)
+        checks = response.json()
+        self.assertEqual((checks["status"], checks["database"]), ("ok", "ok"))
+        # the local memory cache is not worth checking
+        self.assertNotIn("cache:default", checks)
+
+        # nothing listens on port 1
+        caches = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+                "LOCATION": "127.0.0.1:1",
+            }
+        }
+        with override_settings(CACHES=caches):
+            response = self.client.get("/health/ready/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["cache:default"], "unreadable")
+
+        with mock.patch("ecommerce_api.views.connection.cursor", side_effect=Exception("down")):
+            response = self.client.get("/health/ready/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["database"], "down")
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTest(TestCase):
+    def make_pool(self, **kwargs):
+        self.opened = []
+
+        def connect():
+            self.opened.append(FakeConnection())
+            return self.opened[-1]
+
+        return ConnectionPool(connect, **kwargs)
+
+    def test_bounded(self):
+        pool = self.make_pool(max_size=2, timeout=0.05)
+        first, second = pool.getconn(), pool.getconn()
+        self.assertEqual([first, second], self.opened)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+        pool.putconn(first)
+        self.assertIs(pool.getconn(), first)
+        stats = pool.stats()
+        self.assertEqual((stats["opened"], stats["checkouts"], stats["timeouts"]), (2, 3, 1))
+        self.assertEqual((stats["in_use"], stats["max_in_use"]), (2, 2))
+
+    def test_waits_for_a_returned_connection(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.getconn()
+        threading.Timer(0.05, pool.putconn, (connection,)).start()
+
+        self.assertIs(pool.getconn(), connection)
+        self.assertEqual(pool.stats()["waits"], 1)
+        self.assertGreater(pool.stats()["wait_time"], 0)
+
+    def test_checked_on_checkout(self):
+        def check(connection):
+            if connection.broken:
+                raise Exception("server closed the connection unexpectedly")
+
+        pool = self.make_pool(check=check, check_after=0)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        connection.broken = True
+
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(connection.closed, 1)
+        stats = pool.stats()
+        self.assertEqual((stats["failed_checks"], stats["size"], stats["closed"]), (1, 1, 1))
+
+        # closed connections are dropped without a check
+        pool.putconn(replacement)
+        replacement.closed = 2
+        self.assertNotIn(pool.getconn(), (connection, replacement))
+        self.assertEqual(pool.stats()["failed_checks"], 1)
+
+    def test_min_size_and_lifetime(self):
+        pool = self.make_pool(min_size=1, max_idle=0, max_lifetime=None)
+        pool.fill()
+        self.assertEqual(len(self.opened), 1)
+
+        first, second = pool.getconn(), pool.getconn()
+        pool.putconn(first)
+        pool.putconn(second)
+        # idle past max_idle, closed down to min_size
+        self.assertEqual((pool.stats()["size"], pool.stats()["idle"]), (1, 1))
+        self.assertEqual(first.closed, 1)
+
+        pool.max_lifetime = 0
+        connection = pool.getconn()
+        self.assertIsNot(connection, second)
+        pool.putconn(connection)
+        self.assertEqual((connection.closed, pool.stats()["size"]), (1, 0))
+
+
+@skipUnless(connection.vendor == "postgresql", "pooled postgres backend")
+class PooledBackendTest(TestCase):
+    def setUp(self):
+        settings_dict = {
+            **connection.settings_dict,
+            "ENGINE": "ecommerce_api.postgresql_pool",
+            "POOL": {"MAX_SIZE": 1, "CHECK_AFTER": 0},
+        }
+        # contrib.postgres looks the connection up by alias
+        patcher = mock.patch.dict(connections.databases, {"pooled": settings_dict})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pooled = connections["pooled"]
+
+    def tearDown(self):
+        from .postgresql_pool.base import close_pools
+
+        self.pooled.close()
+        del connections["pooled"]
+        close_pools(alias="pooled")
+
+    def select_one(self):
+        with self.pooled.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            return cursor.fetchone()[0]
+
+    def test_reused_across_close(self):
+        self.assertEqual(self.select_one(), 1)
+        raw = self.pooled.connection
+        self.pooled.close()
+        self.assertEqual(self.pooled.pool_stats()["idle"], 1)
+
+        self.assertEqual(self.select_one(), 1)
+        self.assertIs(self.pooled.connection, raw)
+        self.assertEqual(self.pooled.pool_stats()["opened"], 1)
+
+    def test_dead_connection_replaced(self):
+        self.select_one()
+        pid = self.pooled.connection.get_backend_pid()
+        self.pooled.close()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+
+        self.assertEqual(self.select_one(), 1)
+        self.assertNotEqual(self.pooled.connection.get_backend_pid(), pid)
+        stats = self.pooled.pool_stats()
+        self.assertEqual((stats["failed_checks"], stats["opened"], stats["size"]), (1, 2, 1))
+
+    def test_transaction_rolled_back_on_return(self):
+        from psycopg2 import extensions
+
+        self.pooled.set_autocommit(False)
+        self.select_one()
+        raw = self.pooled.connection
+        self.assertEqual(raw.get_transaction_status(), extensions.TRANSACTION_STATUS_INTRANS)
+
+        self.pooled.close()
+        self.assertEqual(raw.get_transaction_status(), extensions.TRANSACTION_STATUS_IDLE)
+        self.assertEqual(self.pooled.pool_stats()["idle"], 1)
@@ -1,11 +1,13 @@
 from django.contrib import admin
 from django.urls import path
 
-# from graphene_django.views import GraphQLView
-from graphene_file_upload.django import FileUploadGraphQLView
 from django.views.decorators.csrf import csrf_exempt
 
+from .views import CachedGraphQLView, health_live, health_ready
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphview/', csrf_exempt(FileUploadGraphQLView.as_view(graphiql=True))),
+    path('health/live/', health_live),
+    path('health/ready/', health_ready),
+    path('graphview/', csrf_exempt(CachedGraphQLView.as_view(graphiql=True))),
 ]
@@ -0,0 +1,117 @@
+from django.core.cache import caches
+from django.db import connection
+from django.http import JsonResponse
+from graphene_file_upload.django import FileUploadGraphQLView
+
+from .caches import is_local, shared_aliases
+from .documents import PersistedQueryError, document_backend, persisted_queries
+from .profiling import profiler
+from .response_cache import response_cache
+
+
+class CachedGraphQLView(FileUploadGraphQLView):
+    """
+    FileUploadGraphQLView answering anonymous catalog queries from the
+    response cache, see ecommerce_api/response_cache.py, and parsing and
+    validating each distinct query once, see ecommerce_api/documents.py.
+    """
+
+    response_cache = response_cache
+
+    def get_backend(self, request):
+        return document_backend
+
+    def json_encode(self, request, d, pretty=False):
+        entry = getattr(request, "_response_cache_entry", None)
+        if entry is not None and "data" in d and "errors" not in d:
+            # kept without extensions, they describe this execution only
+            key, ttl = entry
+            self.response_cache.store(key, super().json_encode(request, d, pretty), ttl)
+
+        extensions = {}
+        if getattr(request, "query_cost", None) is not None:
+            extensions["cost"] = request.query_cost
+        if getattr(request, "graphql_profile_report", None) is not None:
+            extensions["profile"] = request.graphql_profile_report
+        if extensions and ("data" in d or "errors" in d):
+            d = {**d, "extensions": extensions}
+        return super().json_encode(request, d, pretty)
+
+    def execute_graphql_request(self, request, *args, **kwargs):
+        if not profiler.enabled:
+            return super().execute_graphql_request(request, *args, **kwargs)
+
+        request.graphql_profile = profile = profiler.start()
+        with connection.execute_wrapper(profile.execute_wrapper):
+            result = super().execute_graphql_request(request, *args, **kwargs)
+        profile.finish()
+        request.graphql_profile_report = profiler.publish(request, profile)
+        return result
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        status = getattr(request, "_response_cache_status", None)
+        if status is not None:
+            response["X-Response-Cache"] = status
+        return response
+
+    def get_response(self, request, data, show_graphiql=False):
+        try:
+            query = persisted_queries.resolve(request, data)
+        except PersistedQueryError as e:
+            return self.json_encode(request, {"errors": [e.as_error()]}), 200
+        if query is not None:
+            data = {key: data.get(key) for key in data}
+            data["query"] = query
+
+        if show_graphiql or self.batch:
+            return super().get_response(request, data, show_graphiql)
+
+        query, variables, operation_name, _ = self.get_graphql_params(request, data)
+        key, body, ttl = self.response_cache.lookup(request, query, variables, operation_name)
+        if key is None:
+            return super().get_response(request, data, show_graphiql)
+
+        if body is not None:
+            request._response_cache_status = "HIT"
+            return body, 200
+
+        request._response_cache_status = "MISS"
+        # stored by json_encode, responses with errors are not kept
+        request._response_cache_entry = (key, ttl)
+        return super().get_response(request, data, show_graphiql)
+
+
+def health_live(request):
+    """The process serves requests, for the orchestrator's liveness probe."""
+    return JsonResponse({"status": "ok"})
+
+
+def health_ready(request):
+    """The database and the shared caches answer, for the readiness probe."""
+    checks = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = str(e)
+    # a process local cache always answers, only a shared one can be down
+    for alias in sorted(set(shared_aliases().values())):
+        if is_local(alias):
+            continue
+        try:
+            cache = caches[alias]
+            cache.set("health:ready", 1, 10)
+            ok = cache.get("health:ready") == 1
+            checks[f"cache:{alias}"] = "ok" if ok else "unreadable"
+        except Exception as e:
+            checks[f"cache:{alias}"] = str(e)
+
+    ready = all(value == "ok" for value in checks.values())
+    pool_stats = getattr(connection, "pool_stats", None)
+    if pool_stats is not None:
+        checks["database_pool"] = pool_stats()
+    return JsonResponse(
+        {"status": "ok" if ready else "unavailable", **checks}, status=200 if ready else 503
+    )
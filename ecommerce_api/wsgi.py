@@ -1,7 +1,8 @@
 """
-WSGI config for ecomerce_api project.
+WSGI config for ecommerce_api project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+Served in production by gunicorn, see gunicorn.conf.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
@@ -11,6 +12,6 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecomerce_api.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_api.settings')
 
 application = get_wsgi_application()
@@ -0,0 +1,43 @@
+"""
+gunicorn settings of the production server.
+
+usage: gunicorn -c gunicorn.conf.py ecommerce_api.wsgi
+
+Every value can be overridden from the environment. The threads of a
+worker share its pool of at most DB_POOL_MAX_SIZE database connections,
+the database has to accept WEB_CONCURRENCY * DB_POOL_MAX_SIZE connections
+per instance.
+"""
+import multiprocessing
+
+# not `config`, gunicorn reads every module level name as a setting
+from decouple import config as env
+
+bind = env('GUNICORN_BIND', default='0.0.0.0:8000')
+
+# processes for CPU bound work (graphql parsing, serialization), threads to
+# overlap database and cache round trips within a process
+workers = env('WEB_CONCURRENCY', default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+worker_class = 'gthread'
+threads = env('GUNICORN_THREADS', default=4, cast=int)
+
+timeout = env('GUNICORN_TIMEOUT', default=30, cast=int)
+graceful_timeout = env('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+keepalive = env('GUNICORN_KEEPALIVE', default=5, cast=int)
+
+# recycle workers now and then, bounds the growth of the per-process caches
+max_requests = env('GUNICORN_MAX_REQUESTS', default=5000, cast=int)
+max_requests_jitter = max_requests // 10
+
+# django is imported once in the master and shared copy-on-write
+preload_app = env('GUNICORN_PRELOAD', default=True, cast=bool)
+
+accesslog = env('GUNICORN_ACCESS_LOG', default='-')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # a connection opened while loading the app must not be shared by workers
+    from django.db import connections
+
+    connections.close_all()
@@ -8,7 +8,8 @@ from .models import (
     ProductImage,
     Wish,
     Cart,
-    RequestCart,
+    Order,
+    OrderLine,
 )
 
 
@@ -21,7 +22,8 @@ admin.site.register(
         ProductImage,
         Wish,
         Cart,
-        RequestCart,
+        Order,
+        OrderLine,
     )
 )
 
@@ -0,0 +1,80 @@
+import time
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from ecommerce_api.cache import LRUCache
+
+from .models import Category
+
+
+class CategoryCache(object):
+    """
+    The category listing, with per-category product counts.
+
+    Rows live in the django cache under a version number that every
+    Category write and every product entering or leaving a category bumps.
+    With a cache shared by the processes, memcached in production, each
+    process sees a change on its next read; a local-memory cache only
+    serves the process that wrote, see products/checks.py. Each process also
+    keeps the rows of the versions it has read, a request then costs one
+    cache get for the version and no database query.
+    """
+
+    key_prefix = "catalog:categories"
+
+    def __init__(self, config: Optional[dict] = None):
+        if config is None:
+            config = getattr(settings, "CATEGORY_CACHE", {})
+        self.alias = config.get("ALIAS", "default")
+        self.ttl = config.get("TTL", 3600)
+        self.local = LRUCache(4)
+        self.fields = [field.attname for field in Category._meta.concrete_fields]
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get(self) -> List[Category]:
+        version = self._version()
+        rows = self.local.get(version)
+        if rows is None:
+            key = f"{self.key_prefix}:{version}"
+            rows = self.shared.get(key)
+            if rows is None:
+                rows = self._load()
+                self.shared.set(key, rows, self.ttl)
+            self.local.set(version, rows)
+        return [Category.from_db(DEFAULT_DB_ALIAS, self.fields, row) for row in rows]
+
+    def invalidate(self):
+        try:
+            self.shared.incr(self._version_key())
+        except ValueError:
+            self._version()
+
+    def clear(self):
+        self.local.clear()
+        self.invalidate()
+
+    def stats(self) -> dict:
+        return self.local.stats()
+
+    def _version(self) -> int:
+        version = self.shared.get(self._version_key())
+        if version is None:
+            # an evicted version must not restart at a number whose rows
+            # some process still holds
+            self.shared.add(self._version_key(), int(time.time() * 1000), None)
+            version = self.shared.get(self._version_key())
+        return version
+
+    def _load(self) -> list:
+        return list(Category.objects.order_by("name").values_list(*self.fields))
+
+    def _version_key(self) -> str:
+        return f"{self.key_prefix}:version"
+
+
+category_cache = CategoryCache()
@@ -0,0 +1,18 @@
+from django.core.checks import Error, Tags, register
+from ecommerce_api.caches import is_local, shared_aliases
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    errors = []
+    for name, alias in shared_aliases().items():
+        if is_local(alias):
+            errors.append(
+                Error(
+                    f"{name} uses the cache '{alias}', which is local to each process.",
+                    hint="Set CACHE_LOCATION to a memcached server, a write in one "
+                    "worker is not seen by the others otherwise.",
+                    id="products.E001",
+                )
+            )
+    return errors
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.services import reservation_service
+
+
+class Command(BaseCommand):
+    help = 'Release expired cart reservations, run it from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='holds per transaction')
+
+    def handle(self, *args, **options):
+        released = reservation_service.reap_expired(options['batch_size'])
+        self.stdout.write(f'released {released} reservations')
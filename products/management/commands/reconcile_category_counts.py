@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.services import category_service
+
+
+class Command(BaseCommand):
+    help = 'Recount the products of every category, run it from cron'
+
+    def handle(self, *args, **options):
+        changed = category_service.reconcile_product_counts()
+        self.stdout.write(f'fixed {changed} categories')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.services import rating_service
+
+
+class Command(BaseCommand):
+    help = 'Recompute product rating aggregates from the comments, run it from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='products per batch')
+
+    def handle(self, *args, **options):
+        fixed = rating_service.reconcile_ratings(options['batch_size'])
+        self.stdout.write(f'fixed {fixed} products')
@@ -0,0 +1,122 @@
+# Generated by Django 2.2.7 on 2026-10-18 17:21
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# a checkout used to write one RequestCart row per product, rows of the same
+# buyer and seller written within this window become one order
+CHECKOUT_WINDOW = timedelta(seconds=1)
+
+
+def request_carts_to_orders(apps, schema_editor):
+    RequestCart = apps.get_model('products', 'RequestCart')
+    Order = apps.get_model('products', 'Order')
+    OrderLine = apps.get_model('products', 'OrderLine')
+
+    def flush(group):
+        first = group[0]
+        order = Order.objects.create(
+            user_id=first.user_id,
+            business_id=first.business_id,
+            total_price=sum(row.price for row in group),
+            total_quantity=sum(row.quantity for row in group),
+            line_count=len(group),
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=first.created_at)
+        OrderLine.objects.bulk_create(
+            [
+                OrderLine(
+                    order_id=order.pk,
+                    product_id=row.product_id,
+                    product_name=row.product.name,
+                    quantity=row.quantity,
+                    # request rows stored the line total, quantity may be 0
+                    price=row.price / row.quantity if row.quantity else row.price,
+                    total_price=row.price,
+                )
+                for row in group
+            ]
+        )
+
+    group = []
+    rows = RequestCart.objects.select_related('product').order_by(
+        'user_id', 'business_id', 'created_at', 'pk'
+    )
+    for row in rows.iterator():
+        if group and (
+            (row.user_id, row.business_id) != (group[0].user_id, group[0].business_id)
+            or row.created_at - group[0].created_at > CHECKOUT_WINDOW
+        ):
+            flush(group)
+            group = []
+        group.append(row)
+    if group:
+        flush(group)
+
+
+def orders_to_request_carts(apps, schema_editor):
+    RequestCart = apps.get_model('products', 'RequestCart')
+    OrderLine = apps.get_model('products', 'OrderLine')
+
+    for line in OrderLine.objects.filter(product__isnull=False).select_related('order'):
+        request = RequestCart.objects.create(
+            user_id=line.order.user_id,
+            business_id=line.order.business_id,
+            product_id=line.product_id,
+            quantity=line.quantity,
+            price=line.total_price,
+        )
+        RequestCart.objects.filter(pk=request.pk).update(created_at=line.order.created_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('products', '0006_product_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_quantity', models.PositiveIntegerField()),
+                ('line_count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='business_orders', to='products.Business')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=255)),
+                ('quantity', models.PositiveIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_lines', to='products.Order')),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='product_order_lines', to='products.Product')),
+            ],
+        ),
+        migrations.RunPython(request_carts_to_orders, orders_to_request_carts),
+        migrations.DeleteModel(
+            name='RequestCart',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['business', 'created_at', 'id'], name='order_business_created_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 2.2.7 on 2026-10-18 17:25
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# rating and stock writes touch product rows all the time, only rebuild the
+# search vector when a column it is made of changes (search_vector is in the
+# list for the category rename trigger, which resets it to NULL)
+NARROW_SEARCH_TRIGGER = """
+DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product;
+CREATE TRIGGER products_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, category_id, search_vector
+    ON products_product
+    FOR EACH ROW EXECUTE PROCEDURE products_product_search_vector();
+"""
+
+WIDEN_SEARCH_TRIGGER = """
+DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product;
+CREATE TRIGGER products_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON products_product
+    FOR EACH ROW EXECUTE PROCEDURE products_product_search_vector();
+"""
+
+
+def narrow_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(NARROW_SEARCH_TRIGGER, params=None)
+
+
+def widen_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(WIDEN_SEARCH_TRIGGER, params=None)
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductComment = apps.get_model('products', 'ProductComment')
+
+    comments = (
+        ProductComment.objects.filter(product_id=OuterRef('pk'))
+        .values('product_id')
+        .order_by()
+    )
+    Product.objects.update(
+        rating_avg=Coalesce(
+            Subquery(comments.annotate(avg=Avg('rate')).values('avg'), output_field=FloatField()),
+            Value(0.0),
+        ),
+        rating_count=Coalesce(
+            Subquery(comments.annotate(count=Count('pk')).values('count'), output_field=IntegerField()),
+            Value(0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_orders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(narrow_search_trigger, widen_search_trigger),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating_avg', 'id'], name='product_rating_id_idx'),
+        ),
+    ]
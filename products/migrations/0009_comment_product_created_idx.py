@@ -0,0 +1,17 @@
+# Generated by Django 2.2.7 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_ratings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productcomment',
+            index=models.Index(fields=['product', 'created_at', 'id'], name='comment_product_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.7 on 2026-10-18 17:33
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_products(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+
+    counts = (
+        Product.objects.filter(category_id=OuterRef('pk'))
+        .order_by()
+        .values('category_id')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Category.objects.update(
+        product_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_comment_product_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
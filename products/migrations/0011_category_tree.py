@@ -0,0 +1,34 @@
+# Generated by Django 2.2.7 on 2026-10-18 17:38
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+import django.db.models.deletion
+
+
+def backfill_paths(apps, schema_editor):
+    # every existing category is a root
+    Category = apps.get_model('products', 'Category')
+    Category.objects.update(path=Concat(Cast('id', CharField()), Value('/')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_category_product_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='products.Category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
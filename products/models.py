@@ -1,14 +1,65 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from users.models import ImageUpload
 
 User = get_user_model()
 
 
-class Category(models.Model):
+class CounterFieldsMixin(object):
+    """
+    Leaves `counter_fields` out of full saves of existing rows.
+
+    Counters are kept by UPDATE ... SET x = x + n, saving an instance loaded
+    before such an update would write the old value back.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class Category(CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=255, unique=True, db_index=True)
+    parent = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.CASCADE, related_name='children'
+    )
+    # materialized path of ids from the root, "1/7/12/", a subtree is every
+    # category whose path starts with the path of its root
+    path = models.CharField(max_length=255, db_index=True, editable=False)
+    # kept by Product signals, see products/signals.py
+    product_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now=False, auto_now_add=True)
 
+    counter_fields = ('product_count',)
+
+    def save(self, *args, **kwargs):
+        parent_path = self.parent.path if self.parent_id else ''
+        if self.pk and str(self.pk) in parent_path.split('/'):
+            raise Exception('a category cannot be moved under its own subtree')
+
+        old_path = self.path
+        super().save(*args, **kwargs)
+
+        path = f'{parent_path}{self.pk}/'
+        if path != old_path:
+            Category.objects.filter(pk=self.pk).update(path=path)
+            if old_path:
+                # the whole subtree follows
+                Category.objects.filter(path__startswith=old_path).exclude(
+                    pk=self.pk
+                ).update(path=Concat(Value(path), Substr('path', len(old_path) + 1)))
+            self.path = path
+
     def __str__(self):
         return f'name: {self.name}, created_at: {self.created_at.strftime("%Y-%m-%d %H:%M:%S")}'
 
@@ -25,7 +76,7 @@ class Business(models.Model):
         return f'name: {self.name}, created_at: {self.created_at.strftime("%Y-%m-%d %H:%M:%S")}, updated_at: {self.updated_at.strftime("%Y-%m-%d %H:%M:%S")}'
 
 
-class Product(models.Model):
+class Product(CounterFieldsMixin, models.Model):
     category = models.ForeignKey(
         'Category', on_delete=models.CASCADE, related_name='product_categories'
     )
@@ -35,14 +86,40 @@ class Product(models.Model):
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=5, decimal_places=2)
     total_availeble = models.PositiveIntegerField()
+    # units held by live reservations, sellable stock is
+    # total_availeble - total_reserved
+    total_reserved = models.PositiveIntegerField(default=0)
     total_count = models.PositiveIntegerField()
     description = models.TextField()
+    # aggregates of product_comments.rate, see services/rating_service.py
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # weighted name/category/description document, maintained by a postgres
+    # trigger (see migration 0004), always NULL on other backends
+    search_vector = SearchVectorField(null=True, editable=False)
 
     created_at = models.DateTimeField(auto_now=False, auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    counter_fields = ('total_reserved', 'rating_avg', 'rating_count')
+
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            # keyset pagination over the default ordering
+            models.Index(fields=['created_at', 'id'], name='product_created_at_id_idx'),
+            # listing hot path, see benchmarks/explain.py
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['rating_avg', 'id'], name='product_rating_id_idx'),
+            models.Index(
+                fields=['category', 'created_at', 'id'],
+                name='product_category_created_idx',
+            ),
+            models.Index(
+                fields=['business', 'created_at', 'id'],
+                name='product_business_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'name: {self.name}, category: {self.category.name}, business: {self.business.name}'
@@ -75,6 +152,14 @@ class ProductComment(models.Model):
     rate = models.IntegerField(default=3)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # paginated comments of a product, see ProductType.comments
+            models.Index(
+                fields=['product', 'created_at', 'id'], name='comment_product_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return f'{str(self.product)}: {self.created_at.strftime("%Y-%m-%d %H:%M:%S")}'
 
@@ -100,21 +185,64 @@ class Cart(models.Model):
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='cart_user_created_at_idx'),
+        ]
 
 
-class RequestCart(models.Model):
-    user = models.ForeignKey(
-        User, related_name="user_requests", on_delete=models.CASCADE
-    )
+class Order(models.Model):
+    """One seller's share of a checkout, totals are computed when it is placed."""
+
+    user = models.ForeignKey(User, related_name="user_orders", on_delete=models.CASCADE)
     business = models.ForeignKey(
-        Business, related_name="business_requests", on_delete=models.CASCADE
+        Business, related_name="business_orders", on_delete=models.CASCADE
     )
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+    total_quantity = models.PositiveIntegerField()
+    line_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+        indexes = [
+            # buyer and seller order history, id keeps keyset pages stable
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            models.Index(
+                fields=['business', 'created_at', 'id'], name='order_business_created_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.pk}: {self.total_price}, created_at: {self.created_at.strftime("%Y-%m-%d %H:%M:%S")}'
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, related_name="order_lines", on_delete=models.CASCADE)
+    # orders outlive the products they sold, name and price are kept on the line
     product = models.ForeignKey(
-        Product, related_name="product_requests", on_delete=models.CASCADE
+        Product, related_name="product_order_lines", null=True, on_delete=models.SET_NULL
     )
+    product_name = models.CharField(max_length=255)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product_name} x {self.quantity}"
+
+
+class Reservation(models.Model):
+    # SET_NULL so deleting a cart never drops a hold without giving the
+    # units back, orphaned holds are released by the reaper
+    cart = models.OneToOneField(
+        Cart, related_name="reservation", null=True, on_delete=models.SET_NULL
+    )
+    product = models.ForeignKey(
+        Product, related_name="product_reservations", on_delete=models.CASCADE
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    class Meta:
-        ordering = ("created_at",)
+    def __str__(self):
+        return f'{self.product_id} x {self.quantity}: {self.expires_at.strftime("%Y-%m-%d %H:%M:%S")}'
@@ -116,7 +116,7 @@ class CreateProductComment(graphene.Mutation):
         rate = graphene.Int()
 
     @is_authenticated
-    def mutate(self, info, product_id, comment, rate):
+    def mutate(self, info, product_id, comment, rate=None):
         product_comment = product_service.create_product_comment(
             product_id, comment, info.context.user, rate
         )
@@ -1,8 +1,11 @@
 import graphene
+from ecommerce_api.optimizer import optimize_queryset
 from ecommerce_api.pagination import paginate
+from ecommerce_api.permissions import is_authenticated
 
-from .types import CategoryType, ProductType
-from .services import category_service, product_service
+from .models import Product
+from .types import CategoryType, OrderType, ProductFacetsType, ProductType
+from .services import category_service, order_service, product_service
 from .mutations import (
     CreateBusiness,
     UpdateBusiness,
@@ -23,27 +26,56 @@ from .mutations import (
 class Query(graphene.ObjectType):
     categories = graphene.List(CategoryType, name=graphene.String())
     products = graphene.Field(
-        paginate(ProductType),
+        paginate(ProductType, cursor=True, facets=ProductFacetsType),
         search=graphene.String(),
         min_price=graphene.Float(),
         max_price=graphene.Float(),
+        category_id=graphene.ID(),
         category=graphene.String(),
         business=graphene.String(),
         sort_by=graphene.String(),
         is_asc=graphene.Boolean(),
         page=graphene.Int(),
         page_size=graphene.Int(),
+        after=graphene.String(),
+        before=graphene.String(),
     )
     product = graphene.Field(ProductType, id=graphene.ID(required=True))
+    orders = graphene.Field(
+        paginate(OrderType, cursor=True),
+        page=graphene.Int(),
+        page_size=graphene.Int(),
+        after=graphene.String(),
+        before=graphene.String(),
+    )
+    business_orders = graphene.Field(
+        paginate(OrderType, cursor=True),
+        page=graphene.Int(),
+        page_size=graphene.Int(),
+        after=graphene.String(),
+        before=graphene.String(),
+    )
 
-    def resolve_categories(self, info, name):
+    def resolve_categories(self, info, name=None):
         return category_service.get_categories(name)
 
     def resolve_products(self, info, **kwargs):
-        return product_service.get_products(**kwargs)
+        return optimize_queryset(product_service.get_products(**kwargs), info)
 
     def resolve_product(self, info, id):
-        return product_service.get_product(id)
+        return product_service.get_product(
+            id, optimize_queryset(Product.objects.all(), info)
+        )
+
+    @is_authenticated
+    def resolve_orders(self, info, **kwargs):
+        return optimize_queryset(order_service.get_user_orders(info.context.user), info)
+
+    @is_authenticated
+    def resolve_business_orders(self, info, **kwargs):
+        return optimize_queryset(
+            order_service.get_business_orders(info.context.user), info
+        )
 
 
 class Mutation(graphene.ObjectType):
@@ -0,0 +1,170 @@
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from typing import Iterable, Optional, Set
+
+from django.conf import settings
+from django.utils import timezone
+from ecommerce_api.services.base_service import normalize_query
+
+tokenize = re.compile(r"\w+").findall
+
+PRODUCT_INDEX_FIELDS = ("id", "name", "description", "category__name")
+
+
+class InvertedIndex(object):
+    """
+    In-process inverted index of product name, description and category.
+
+    Each term maps to a sorted `array('I')` of product ids and each product
+    keeps the array of its term ids so it can be re-indexed or removed in
+    place. Words of a search term match as prefixes, mirroring the partial
+    matches of the icontains search; ids returned are candidates to be
+    filtered further by the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, product_id: int, *texts: str):
+        with self._lock:
+            self._remove(product_id)
+            term_ids = self._term_ids(texts)
+            self._documents[product_id] = array("I", term_ids)
+            for term_id in term_ids:
+                insort(self._postings[term_id], product_id)
+
+    def remove(self, product_id: int):
+        with self._lock:
+            self._remove(product_id)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def bulk_load(self, rows: Iterable[tuple]):
+        """Replace the index with `(id, *texts)` rows, sorting once at the end."""
+        with self._lock:
+            self._reset()
+            postings = []
+            for product_id, *texts in rows:
+                term_ids = self._term_ids(texts, postings)
+                self._documents[product_id] = array("I", term_ids)
+                for term_id in term_ids:
+                    postings[term_id].append(product_id)
+
+            self._postings = [array("I", sorted(ids)) for ids in postings]
+            self._terms.sort()
+            self.built = True
+
+    def search(self, query_string: str) -> Set[int]:
+        result = None
+        with self._lock:
+            for term in normalize_query(query_string):
+                for word in tokenize(term.lower()):
+                    ids = self._prefix_ids(word)
+                    result = ids if result is None else result & ids
+                    if not result:
+                        return set()
+        return result or set()
+
+    def _reset(self):
+        self.built = False
+        self._vocabulary = {}
+        self._terms = []
+        self._postings = []
+        self._documents = {}
+
+    def _term_ids(self, texts, postings=None) -> list:
+        # new terms go to `postings` (bulk load, sorted later) or are
+        # inserted in place into the sorted term list
+        term_ids = set()
+        for text in texts:
+            for word in tokenize(text.lower()):
+                term_id = self._vocabulary.get(word)
+                if term_id is None:
+                    term_id = self._vocabulary[word] = len(self._vocabulary)
+                    if postings is None:
+                        self._postings.append(array("I"))
+                        insort(self._terms, word)
+                    else:
+                        postings.append([])
+                        self._terms.append(word)
+                term_ids.add(term_id)
+        return sorted(term_ids)
+
+    def _prefix_ids(self, prefix: str) -> Set[int]:
+        ids = set()
+        position = bisect_left(self._terms, prefix)
+        while position < len(self._terms) and self._terms[position].startswith(prefix):
+            ids.update(self._postings[self._vocabulary[self._terms[position]]])
+            position += 1
+        return ids
+
+    def _remove(self, product_id: int):
+        for term_id in self._documents.pop(product_id, ()):
+            postings = self._postings[term_id]
+            position = bisect_left(postings, product_id)
+            if position < len(postings) and postings[position] == product_id:
+                del postings[position]
+
+
+class ProductIndex(InvertedIndex):
+    """
+    The catalog index of this process.
+
+    Built on first search and kept current by Product/Category signals.
+    Writes made by other processes are picked up through `updated_at` once
+    `refresh_interval` seconds have passed since the last sync.
+    """
+
+    def __init__(self, refresh_interval: Optional[float] = None):
+        super().__init__()
+        self.refresh_interval = refresh_interval
+        self.synced_at = None
+
+    def search(self, query_string: str) -> Set[int]:
+        with self._lock:
+            if not self.built:
+                self.rebuild()
+            elif self.refresh_interval is not None:
+                if (timezone.now() - self.synced_at).total_seconds() > self.refresh_interval:
+                    self.refresh()
+        return super().search(query_string)
+
+    def rebuild(self):
+        from .models import Product
+
+        synced_at = timezone.now()
+        rows = Product.objects.values_list(*PRODUCT_INDEX_FIELDS).iterator(chunk_size=10000)
+        self.bulk_load(rows)
+        self.synced_at = synced_at
+
+    def refresh(self):
+        from .models import Product
+
+        synced_at = timezone.now()
+        rows = Product.objects.filter(updated_at__gte=self.synced_at).values_list(
+            *PRODUCT_INDEX_FIELDS
+        )
+        for product_id, *texts in rows:
+            self.add(product_id, *texts)
+        self.synced_at = synced_at
+
+    def index_product(self, product):
+        if self.built:
+            self.add(product.id, product.name, product.description, product.category.name)
+
+    def index_category(self, category):
+        if self.built:
+            rows = category.product_categories.values_list(*PRODUCT_INDEX_FIELDS)
+            for product_id, *texts in rows:
+                self.add(product_id, *texts)
+
+
+product_index = ProductIndex(getattr(settings, "PRODUCT_SEARCH_INDEX_REFRESH", 60))
@@ -1,11 +1,59 @@
-from typing import Optional
-from django.db.models import QuerySet, Q
+from typing import List, Optional
 
-from ..models import Category
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 
+from ..category_cache import category_cache
+from ..models import Category, Product
 
-def get_categories(name: Optional[str] = None) -> QuerySet:
-    qs = Category.objects.prefetch_related('product_categories')
+
+def get_categories(name: Optional[str] = None) -> List[Category]:
+    categories = category_cache.get()
     if name:
-        qs.filter(Q(name__icontains=name) | Q(name__iexact=name)).distinct()
-    return qs
+        name = name.lower()
+        categories = [c for c in categories if name in c.name.lower()]
+    return categories
+
+
+def get_subtree_ids(
+    category_id: Optional[int] = None, name: Optional[str] = None
+) -> List[int]:
+    """
+    Ids of a category and all of its descendants, empty for an unknown one.
+
+    Resolved from the cached listing by path prefix, a product filter on
+    them is a plain category_id IN (...) over the category index.
+    """
+    categories = category_cache.get()
+    if category_id is not None:
+        root = next((c for c in categories if c.pk == int(category_id)), None)
+    else:
+        name = (name or '').lower()
+        root = next((c for c in categories if c.name.lower() == name), None)
+    if root is None:
+        return []
+    if not root.path:
+        # every path starts with an empty one, never widen to all categories
+        return [root.pk]
+    return [c.pk for c in categories if c.path.startswith(root.path)]
+
+
+def reconcile_product_counts() -> int:
+    """Recount the products of every category, returns how many changed."""
+    counts = (
+        Product.objects.filter(category_id=OuterRef('pk'))
+        .order_by()
+        .values('category_id')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    actual = Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+    changed = (
+        Category.objects.annotate(actual=actual)
+        .exclude(product_count=actual)
+        .values_list('pk', flat=True)
+    )
+    updated = Category.objects.filter(pk__in=list(changed)).update(product_count=actual)
+    if updated:
+        category_cache.invalidate()
+    return updated
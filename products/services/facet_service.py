@@ -0,0 +1,61 @@
+from decimal import Decimal
+from typing import List, Optional, Sequence
+
+from django.db.models import Case, Count, IntegerField, QuerySet, Value, When
+
+from ..category_cache import category_cache
+from ..models import Business
+
+# upper bounds of the price buckets, the last bucket is open ended
+PRICE_BOUNDS = (10, 25, 50, 100, 250)
+
+# every facet is one GROUP BY over the filtered listing query, ordering and
+# pagination stripped
+
+
+def _counts(qs: QuerySet, key, **annotations) -> list:
+    return list(
+        qs.annotate(**annotations)
+        .values_list(key)
+        .annotate(count=Count('pk'))
+        # the default ordering would end up in the GROUP BY
+        .order_by()
+    )
+
+
+def get_category_facets(qs: QuerySet) -> List[dict]:
+    categories = category_cache.get()
+    names = {c.pk: c.name for c in categories}
+    if not qs.query.where:
+        # the unfiltered listing, the kept product counts are the facet
+        counts = [(c.pk, c.product_count) for c in categories if c.product_count]
+    else:
+        counts = _counts(qs, 'category_id')
+    facets = [{'id': pk, 'name': names.get(pk), 'count': count} for pk, count in counts]
+    return sorted(facets, key=lambda f: (-f['count'], f['id']))
+
+
+def get_business_facets(qs: QuerySet) -> List[dict]:
+    counts = _counts(qs, 'business_id')
+    # names looked up by pk afterwards, joining them into the GROUP BY
+    # would join every matching product
+    names = dict(
+        Business.objects.filter(pk__in=[pk for pk, _ in counts]).values_list('pk', 'name')
+    )
+    facets = [{'id': pk, 'name': names.get(pk), 'count': count} for pk, count in counts]
+    return sorted(facets, key=lambda f: (-f['count'], f['id']))
+
+
+def get_price_facets(qs: QuerySet, bounds: Optional[Sequence] = None) -> List[dict]:
+    bounds = sorted(Decimal(str(bound)) for bound in (bounds or PRICE_BOUNDS))
+    bucket = Case(
+        *[When(price__lt=bound, then=Value(i)) for i, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+    counts = dict(_counts(qs, 'price_bucket', price_bucket=bucket))
+    edges = [None, *bounds, None]
+    return [
+        {'min': edges[i], 'max': edges[i + 1], 'count': counts.get(i, 0)}
+        for i in range(len(bounds) + 1)
+    ]
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet, Subquery
+
+from ..models import Business, Order
+
+User = get_user_model()
+
+
+def get_user_orders(user: User) -> QuerySet:
+    return Order.objects.filter(user_id=user.id)
+
+
+def get_business_orders(user: User) -> QuerySet:
+    # a scalar subquery instead of a join, so the planner sees a single
+    # business and walks the (business, created_at) index in order
+    business_id = Business.objects.filter(user_id=user.id).values('pk')[:1]
+    return Order.objects.filter(business_id=Subquery(business_id))
@@ -1,53 +1,66 @@
+from functools import reduce
+from operator import or_
 from typing import Optional
-from django.db.models import QuerySet, Q
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, QuerySet, Q, When
 from django.contrib.auth import get_user_model
-from ecommerce_api.services.base_service import get_query
 
-from ..models import Product, ProductImage, ProductComment, Wish, Cart, RequestCart
+from . import category_service, rating_service, reservation_service, search_service
+from ..models import (
+    Product,
+    ProductImage,
+    ProductComment,
+    Wish,
+    Cart,
+    Order,
+    OrderLine,
+    Reservation,
+)
 
 
 User = get_user_model()
 
 
 def get_products(**search_kwargs) -> QuerySet:
-    qs = Product.objects.select_related("business", "category").prefetch_related(
-        "product_images",
-        "product_comments",
-        "product_wishes",
-        "product_carts",
-        "product_requests",
-    )
+    qs = Product.objects.all()
 
     if search_kwargs.get('search'):
-        search = search_kwargs['search']
-        search_fields = (
-            "name",
-            "description",
-            "category__name",
+        qs = search_service.search_products(
+            qs,
+            search_kwargs['search'],
+            rank=search_kwargs.get('sort_by') == 'relevance',
         )
-        search_data = get_query(search, search_fields)
-        qs = qs.filter(search_data)
 
+    # every join below is to-one, no distinct() needed: it would force a
+    # sort of the whole filtered set and bypass the listing indexes
     if search_kwargs.get('min_price'):
-        qs = qs.filter(price__gte=search_kwargs['min_price']).distinct()
+        qs = qs.filter(price__gte=search_kwargs['min_price'])
 
     if search_kwargs.get('max_price'):
-        qs = qs.filter(price__lte=search_kwargs['max_price']).distinct()
+        qs = qs.filter(price__lte=search_kwargs['max_price'])
 
-    if search_kwargs.get('category'):
-        category = search_kwargs['category']
+    if search_kwargs.get('category_id') or search_kwargs.get('category'):
+        # the whole subtree, `category` is the exact name of its root
         qs = qs.filter(
-            Q(category__name__icontaince=category) | Q(category__name__iexact=category)
-        ).distinct()
+            category_id__in=category_service.get_subtree_ids(
+                search_kwargs.get('category_id'), search_kwargs.get('category')
+            )
+        )
 
     if search_kwargs.get('business'):
         business = search_kwargs['business']
         qs = qs.filter(
-            Q(business__name__icontaince=business) | Q(business__name__iexact=business)
-        ).distinct()
+            Q(business__name__icontains=business) | Q(business__name__iexact=business)
+        )
 
-    if search_kwargs.get('sort_by'):
-        sort_field = search_kwargs['sort_by']
+    sort_field = search_kwargs.get('sort_by')
+    if sort_field == 'rating':
+        sort_field = 'rating_avg'
+    elif sort_field == 'relevance':
+        # only ranked when searching on postgres, default ordering otherwise
+        sort_field = 'search_rank' if 'search_rank' in qs.query.annotations else None
+
+    if sort_field:
         is_asc = search_kwargs.get('is_asc', False)
         sort_by = f'-{sort_field}' if not is_asc else sort_field
         qs = qs.order_by(sort_by)
@@ -55,18 +68,27 @@ def get_products(**search_kwargs) -> QuerySet:
     return qs
 
 
-def get_product(id_: int) -> Product:
-    qs = Product.objects.select_related("business", "category").prefetch_related(
-        "product_images",
-        "product_comments",
-        "product_wishes",
-        "product_carts",
-        "product_requests",
-    )
+def get_product(id_: int, qs: Optional[QuerySet] = None) -> Product:
+    if qs is None:
+        qs = Product.objects.all()
     product = qs.get(pk=id_)
     return product
 
 
+COMMENT_ORDERING = {
+    'newest': ('-created_at',),
+    'oldest': ('created_at',),
+}
+
+
+def get_comments(order: Optional[str] = None) -> QuerySet:
+    try:
+        ordering = COMMENT_ORDERING[order or 'newest']
+    except KeyError:
+        raise Exception(f'invalid comment order - {order}')
+    return ProductComment.objects.order_by(*ordering)
+
+
 def create_product(
     product_data: dict, user: User, images: list, total_count: int
 ) -> Product:
@@ -170,20 +192,25 @@ def create_product_comment(
 
     if business_id:
         own_product = Product.objects.filter(
-            product_id=product_id, business_id=business_id
-        )
+            pk=product_id, business_id=business_id
+        ).exists()
         if own_product:
             raise Exception('you cannot comment your products')
 
-    product_comment, created = ProductComment.objects.get_or_create(
-        user_id=user.id,
-        product_id=product_id,
-        defaults={'comment': comment, 'rate': rate},
-    )
-    if not created:
-        raise Exception(
-            'you cannot comment this product, coz u comment this product as well'
+    if rate is None:
+        rate = 3
+
+    with transaction.atomic():
+        product_comment, created = ProductComment.objects.get_or_create(
+            user_id=user.id,
+            product_id=product_id,
+            defaults={'comment': comment, 'rate': rate},
         )
+        if not created:
+            raise Exception(
+                'you cannot comment this product, coz u comment this product as well'
+            )
+        rating_service.add_rating(product_id, rate)
     return product_comment
 
 
@@ -210,45 +237,136 @@ def handle_wish_list(user: User, product_id: int, is_check: bool = False) -> boo
 
 
 def create_cart(product_id: int, user: User, quantity: int = 1) -> Cart:
-    cart, created = Cart.objects.get_or_crate(
-        product_id=product_id, user_id=user, defaults={'quantity': quantity}
-    )
-    if not created:
-        raise Exception(f'this product_id {product_id} in cart')
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(
+            product_id=product_id, user_id=user.id, defaults={'quantity': quantity}
+        )
+        if not created:
+            raise Exception(f'this product_id {product_id} in cart')
+        reservation_service.hold(cart)
     return cart
 
 
 def update_cart(cart_id: int, user: User, quantity: int = 1) -> Cart:
-    cart = Cart.objects.filter(pk=cart_id, user_id=user.id).first()
+    with transaction.atomic():
+        cart = Cart.objects.filter(pk=cart_id, user_id=user.id).first()
 
-    if not cart:
-        raise Exception(f'invalid cart_id - {cart_id}')
+        if not cart:
+            raise Exception(f'invalid cart_id - {cart_id}')
 
-    cart.quantity = quantity
-    cart.save()
+        cart.quantity = quantity
+        cart.save()
+        reservation_service.hold(cart)
     return cart
 
 
 def delete_cart(cart_id: int):
-    Cart.objects.filter(pk=cart_id).delete()
-
-
-def complete_payment(user: User):
-    user_carts = Cart.objects.filter(user_id=user.id)
+    with transaction.atomic():
+        reservation_service.release([cart_id])
+        Cart.objects.filter(pk=cart_id).delete()
+
+
+def complete_payment(user: User) -> bool:
+    with transaction.atomic():
+        # one joined read that also locks the cart and product rows, ordered
+        # by product so concurrent checkouts take the locks in the same order
+        carts = list(
+            Cart.objects.filter(user_id=user.id)
+            .select_related('product')
+            .select_for_update(of=('self', 'product'))
+            .order_by('product_id', 'pk')
+        )
+        if not carts:
+            raise Exception('cart is empty')
+
+        # live or not, a hold still counts in total_reserved until the reaper
+        # gets to it, so it is converted along with the cart line
+        holds = dict(
+            Reservation.objects.select_for_update()
+            .filter(cart_id__in=[cart_item.pk for cart_item in carts])
+            .values_list('cart_id', 'quantity')
+        )
 
-    RequestCart.objects.bulk_create(
-        [
-            RequestCart(
+        quantities, held = {}, {}
+        for cart_item in carts:
+            product_id = cart_item.product_id
+            quantities[product_id] = quantities.get(product_id, 0) + cart_item.quantity
+            held[product_id] = held.get(product_id, 0) + holds.get(cart_item.pk, 0)
+
+        products = {cart_item.product_id: cart_item.product for cart_item in carts}
+        missing = [
+            str(product_id)
+            for product_id, quantity in quantities.items()
+            if products[product_id].total_availeble
+            - products[product_id].total_reserved
+            + held[product_id]
+            < quantity
+        ]
+        if missing:
+            raise Exception(f'not enough products available: {", ".join(missing)}')
+
+        # guarded set-based decrement, a short count means someone else got
+        # there first and the whole checkout is rolled back
+        updated = Product.objects.filter(
+            reduce(
+                or_,
+                (
+                    Q(
+                        pk=product_id,
+                        total_availeble__gte=F('total_reserved')
+                        - held[product_id]
+                        + quantity,
+                    )
+                    for product_id, quantity in quantities.items()
+                ),
+            )
+        ).update(
+            total_availeble=Case(
+                *[
+                    When(pk=product_id, then=F('total_availeble') - quantity)
+                    for product_id, quantity in quantities.items()
+                ],
+                output_field=IntegerField(),
+            ),
+            total_reserved=Case(
+                *[
+                    When(pk=product_id, then=F('total_reserved') - held[product_id])
+                    for product_id in quantities
+                ],
+                output_field=IntegerField(),
+            ),
+        )
+        if updated != len(quantities):
+            raise Exception('not enough products available')
+
+        # one order per seller, totals computed here so order listings never
+        # aggregate lines; an INSERT per seller, lines go in a single batch
+        lines_by_business = {}
+        for cart_item in carts:
+            lines_by_business.setdefault(cart_item.product.business_id, []).append(
+                OrderLine(
+                    product_id=cart_item.product_id,
+                    product_name=cart_item.product.name,
+                    quantity=cart_item.quantity,
+                    price=cart_item.product.price,
+                    total_price=cart_item.quantity * cart_item.product.price,
+                )
+            )
+        order_lines = []
+        for business_id, lines in lines_by_business.items():
+            order = Order.objects.create(
                 user_id=user.id,
-                business_id=cart_item.product.business.id,
-                product_id=cart_item.product.id,
-                quantity=cart_item.quantity,
-                price=cart_item.quantity * cart_item.product.price,
+                business_id=business_id,
+                total_price=sum(line.total_price for line in lines),
+                total_quantity=sum(line.quantity for line in lines),
+                line_count=len(lines),
             )
-            for cart_item in user_carts
-        ]
-    )
+            for line in lines:
+                line.order = order
+            order_lines.extend(lines)
+        OrderLine.objects.bulk_create(order_lines)
 
-    user_carts.delete()
+        Reservation.objects.filter(cart_id__in=holds).delete()
+        Cart.objects.filter(pk__in=[cart_item.pk for cart_item in carts]).delete()
 
     return True
@@ -0,0 +1,87 @@
+from django.db.models import (
+    Avg,
+    Case,
+    Count,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    IntegerField,
+    Value,
+    When,
+)
+
+from ..models import Product, ProductComment
+
+# rating_avg/rating_count on Product are kept in step with the comments by
+# incremental UPDATEs, reconcile_ratings repairs any drift
+
+
+def _float(expression):
+    return ExpressionWrapper(expression, output_field=FloatField())
+
+
+def add_rating(product_id: int, rate: int) -> None:
+    # both right-hand sides see the row before the update
+    Product.objects.filter(pk=product_id).update(
+        rating_avg=_float(
+            (F('rating_avg') * F('rating_count') + rate) / (F('rating_count') + 1.0)
+        ),
+        rating_count=F('rating_count') + 1,
+    )
+
+
+def remove_rating(product_id: int, rate: int) -> None:
+    Product.objects.filter(pk=product_id, rating_count__gt=0).update(
+        rating_avg=Case(
+            When(rating_count=1, then=Value(0.0)),
+            default=_float(
+                (F('rating_avg') * F('rating_count') - rate) / (F('rating_count') - 1.0)
+            ),
+            output_field=FloatField(),
+        ),
+        rating_count=F('rating_count') - 1,
+    )
+
+
+def reconcile_ratings(batch_size: int = 1000, tolerance: float = 1e-6) -> int:
+    """Recompute the aggregates from the comments, returns how many drifted."""
+    fixed = 0
+    last_pk = 0
+    while True:
+        products = list(
+            Product.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', 'rating_avg', 'rating_count')[:batch_size]
+        )
+        if not products:
+            break
+        last_pk = products[-1][0]
+
+        actual = {
+            row['product_id']: (row['avg'], row['count'])
+            for row in ProductComment.objects.filter(
+                product_id__gte=products[0][0], product_id__lte=last_pk
+            )
+            .values('product_id')
+            .annotate(avg=Avg('rate'), count=Count('pk'))
+            .order_by()
+        }
+        drifted = {}
+        for pk, rating_avg, rating_count in products:
+            avg, count = actual.get(pk, (0.0, 0))
+            if count != rating_count or abs(avg - rating_avg) > tolerance:
+                drifted[pk] = (avg, count)
+
+        if drifted:
+            Product.objects.filter(pk__in=drifted).update(
+                rating_avg=Case(
+                    *[When(pk=pk, then=Value(avg)) for pk, (avg, _) in drifted.items()],
+                    output_field=FloatField(),
+                ),
+                rating_count=Case(
+                    *[When(pk=pk, then=Value(count)) for pk, (_, count) in drifted.items()],
+                    output_field=IntegerField(),
+                ),
+            )
+            fixed += len(drifted)
+    return fixed
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, When
+from django.utils import timezone
+
+from ..models import Cart, Product, Reservation
+
+
+# lock order everywhere is product rows before reservation rows, checkout
+# and the reaper would deadlock each other otherwise
+
+
+def get_ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'RESERVATION_TTL', 900))
+
+
+def shift_reserved(deltas: Dict[int, int]) -> int:
+    """Add a per-product delta to total_reserved in one UPDATE."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    return Product.objects.filter(pk__in=deltas).update(
+        total_reserved=Case(
+            *[
+                When(pk=pk, then=F('total_reserved') + delta)
+                for pk, delta in deltas.items()
+            ],
+            output_field=IntegerField(),
+        )
+    )
+
+
+def hold(cart: Cart) -> Reservation:
+    """Place or refresh the hold for a cart line, sized to its quantity."""
+    with transaction.atomic():
+        product = (
+            Product.objects.select_for_update()
+            .only('id', 'total_availeble', 'total_reserved')
+            .get(pk=cart.product_id)
+        )
+        reservation = (
+            Reservation.objects.select_for_update().filter(cart_id=cart.pk).first()
+        )
+        held = reservation.quantity if reservation else 0
+        delta = cart.quantity - held
+        if delta > 0 and product.total_availeble - product.total_reserved < delta:
+            raise Exception(
+                f'not enough products available for product_id - {cart.product_id}'
+            )
+        shift_reserved({product.pk: delta})
+
+        expires_at = timezone.now() + get_ttl()
+        if reservation:
+            reservation.quantity = cart.quantity
+            reservation.expires_at = expires_at
+            reservation.save(update_fields=['quantity', 'expires_at'])
+        else:
+            reservation = Reservation.objects.create(
+                cart_id=cart.pk,
+                product_id=cart.product_id,
+                quantity=cart.quantity,
+                expires_at=expires_at,
+            )
+    return reservation
+
+
+def release(cart_ids: Iterable[int]) -> int:
+    """Drop the holds of the given cart lines, returns how many were held."""
+    cart_ids = list(cart_ids)
+    with transaction.atomic():
+        product_ids = (
+            Reservation.objects.filter(cart_id__in=cart_ids)
+            .values_list('product_id', flat=True)
+            .distinct()
+        )
+        list(
+            Product.objects.select_for_update()
+            .filter(pk__in=list(product_ids))
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        return _release(
+            Reservation.objects.select_for_update().filter(cart_id__in=cart_ids)
+        )
+
+
+def reap_expired(
+    batch_size: Optional[int] = None, now: Optional[datetime] = None
+) -> int:
+    """Release expired holds, batch_size of them per transaction."""
+    batch_size = batch_size or getattr(settings, 'RESERVATION_REAP_BATCH', 500)
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            candidates = list(
+                Reservation.objects.filter(expires_at__lt=now)
+                .order_by('expires_at')
+                .values_list('pk', 'product_id')[:batch_size]
+            )
+            if not candidates:
+                break
+            list(
+                Product.objects.select_for_update()
+                .filter(pk__in={product_id for _, product_id in candidates})
+                .order_by('pk')
+                .values_list('pk', flat=True)
+            )
+            # re-check under lock, a cart may have refreshed its hold, and
+            # skip whatever a concurrent checkout is converting
+            count = _release(
+                Reservation.objects.select_for_update(skip_locked=True).filter(
+                    pk__in=[pk for pk, _ in candidates], expires_at__lt=now
+                )
+            )
+        released += count
+        if len(candidates) < batch_size or not count:
+            break
+    return released
+
+
+def _release(reservations) -> int:
+    rows = list(reservations.values_list('pk', 'product_id', 'quantity'))
+    deltas = {}
+    for _, product_id, quantity in rows:
+        deltas[product_id] = deltas.get(product_id, 0) - quantity
+    shift_reserved(deltas)
+    Reservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    return len(rows)
@@ -0,0 +1,77 @@
+import re
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, QuerySet
+from django.db.models.functions import Cast
+from ecommerce_api.services.base_service import get_query, normalize_query
+
+from ..search_index import product_index
+
+# must match the configuration used by the search_vector trigger
+SEARCH_CONFIG = "english"
+SEARCH_FIELDS = (
+    "name",
+    "description",
+    "category__name",
+)
+
+
+def search_products(qs: QuerySet, search: str, rank: bool = False) -> QuerySet:
+    """
+    Filter products by `search`, optionally annotating `search_rank`.
+
+    Uses the weighted `search_vector` on postgres and falls back to
+    icontains lookups elsewhere, or to the in-process index when
+    PRODUCT_SEARCH_BACKEND is "memory". Every term must match; quoted
+    phrases match as adjacent words.
+    """
+    if getattr(settings, "PRODUCT_SEARCH_BACKEND", "database") == "memory":
+        return search_index_products(qs, search)
+
+    if connections[qs.db].vendor != "postgresql":
+        return qs.filter(get_query(search, SEARCH_FIELDS))
+
+    query = build_search_query(search)
+    if query is None:
+        return qs
+
+    qs = qs.filter(search_vector=query)
+    if rank:
+        # ts_rank is a float4, cast so the value round-trips exactly in cursors
+        rank_expression = SearchRank(F("search_vector"), query)
+        qs = qs.annotate(search_rank=Cast(rank_expression, FloatField()))
+    return qs
+
+
+def search_index_products(qs: QuerySet, search: str) -> QuerySet:
+    qs = qs.filter(pk__in=product_index.search(search))
+
+    # the index matches phrase words independently, check adjacency on the
+    # candidates only
+    phrases = [term for term in normalize_query(search) if " " in term]
+    if phrases:
+        phrase_query = " ".join(f'"{phrase}"' for phrase in phrases)
+        qs = qs.filter(get_query(phrase_query, SEARCH_FIELDS))
+    return qs
+
+
+def build_search_query(search: str) -> Optional[SearchQuery]:
+    query = None
+    for term in normalize_query(search):
+        if " " in term:
+            term_query = SearchQuery(term, config=SEARCH_CONFIG, search_type="phrase")
+        else:
+            # prefix match each word, as icontains matched partial words
+            words = re.findall(r"\w+", term)
+            if not words:
+                continue
+            term_query = SearchQuery(
+                " & ".join(f"{word}:*" for word in words),
+                config=SEARCH_CONFIG,
+                search_type="raw",
+            )
+        query = term_query if query is None else query & term_query
+    return query
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from ecommerce_api.response_cache import response_cache
+
+from .category_cache import category_cache
+from .models import Business, Category, Product, ProductComment, ProductImage
+from .search_index import product_index
+from .services import rating_service
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    product_index.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    product_index.remove(instance.id)
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, created, **kwargs):
+    if not created:
+        product_index.index_category(instance)
+
+
+@receiver(post_delete, sender=ProductComment)
+def unrate_product(sender, instance, **kwargs):
+    rating_service.remove_rating(instance.product_id, instance.rate)
+
+
+def shift_product_count(category_id, delta):
+    Category.objects.filter(pk=category_id).update(
+        product_count=F('product_count') + delta
+    )
+    # after commit, a reader must not cache the listing as it was before
+    transaction.on_commit(category_cache.invalidate)
+
+
+@receiver(pre_save, sender=Product)
+def remember_category(sender, instance, update_fields=None, **kwargs):
+    instance._previous_category_id = None
+    if instance._state.adding or (
+        update_fields and not {'category', 'category_id'} & set(update_fields)
+    ):
+        return
+    instance._previous_category_id = (
+        Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Product)
+def count_product(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_category_id', None)
+    if created:
+        shift_product_count(instance.category_id, 1)
+    elif previous is not None and previous != instance.category_id:
+        shift_product_count(previous, -1)
+        shift_product_count(instance.category_id, 1)
+
+
+@receiver(post_delete, sender=Product)
+def uncount_product(sender, instance, **kwargs):
+    shift_product_count(instance.category_id, -1)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, **kwargs):
+    transaction.on_commit(category_cache.invalidate)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Business)
+@receiver(post_delete, sender=Business)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductComment)
+@receiver(post_delete, sender=ProductComment)
+def invalidate_responses(sender, **kwargs):
+    transaction.on_commit(lambda: response_cache.invalidate(sender._meta.label))
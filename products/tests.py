@@ -1,3 +1,958 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ecommerce_api.auth import TokenManager
+from ecommerce_api.response_cache import response_cache
+from users.models import ImageUpload, User
+
+from .category_cache import category_cache
+from .search_index import InvertedIndex, product_index
+from .services import (
+    category_service,
+    facet_service,
+    product_service,
+    rating_service,
+    reservation_service,
+)
+from .models import (
+    Business,
+    Cart,
+    Category,
+    Product,
+    ProductComment,
+    ProductImage,
+    Order,
+    OrderLine,
+    Reservation,
+    Wish,
+)
+
+
+class ProductsQueryMixin(object):
+    def create_catalog(self):
+        user = User.objects.create_user(
+            "seller@example.com", "password", first_name="a", last_name="b"
+        )
+        self.business = Business.objects.create(user=user, name="shop")
+        self.categories = [
+            Category.objects.create(name=name) for name in ("books", "phones", "toys")
+        ]
+        self.catalog = [
+            Product.objects.create(
+                category=self.categories[i % 3],
+                business=self.business,
+                name=f"product {i % 4}",
+                price=Decimal(10 + i % 3),
+                total_availeble=10,
+                total_count=10,
+                description=f"description {i}",
+            )
+            for i in range(11)
+        ]
+
+    def execute(self, query, variables=None, **headers):
+        response = self.client.post(
+            "/graphview/",
+            json.dumps({"query": query, "variables": variables or {}}),
+            content_type="application/json",
+            **headers,
+        )
+        return response.json()
+
+
+class KeysetPaginationTest(ProductsQueryMixin, TestCase):
+    query = """
+        query ($sortBy: String, $isAsc: Boolean, $after: String, $before: String, $page: Int) {
+            products(
+                sortBy: $sortBy, isAsc: $isAsc, after: $after, before: $before,
+                page: $page, pageSize: 3
+            ) {
+                current hasNext hasPrev after before results { id }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.create_catalog()
+
+    def products(self, **variables):
+        data = self.execute(self.query, variables)
+        self.assertNotIn("errors", data)
+        return data["data"]["products"]
+
+    def offset_ids(self, **variables):
+        ids, page = [], 1
+        while True:
+            data = self.products(page=page, **variables)
+            ids += [row["id"] for row in data["results"]]
+            if not data["hasNext"]:
+                return ids
+            page += 1
+
+    def test_cursor_walk_matches_offset(self):
+        for sort_by in (None, "price", "name", "created_at", "id", "category__name"):
+            for is_asc in (False, True):
+                variables = {"sortBy": sort_by, "isAsc": is_asc}
+                expected = self.offset_ids(**variables)
+                self.assertEqual(len(expected), len(self.catalog))
+
+                data = self.products(**variables)
+                forward = [row["id"] for row in data["results"]]
+                pages = [data]
+                while data["hasNext"]:
+                    data = self.products(after=data["after"], **variables)
+                    forward += [row["id"] for row in data["results"]]
+                    pages.append(data)
+                self.assertEqual(forward, expected, variables)
+
+                backward = [row["id"] for row in pages[-1]["results"]]
+                while data["hasPrev"]:
+                    data = self.products(before=data["before"], **variables)
+                    backward = [row["id"] for row in data["results"]] + backward
+                self.assertEqual(backward, expected, variables)
+
+    def test_cursor_page_is_single_query(self):
+        after = self.products()["after"]
+        with self.assertNumQueries(1):
+            data = self.products(after=after)
+        self.assertIsNone(data["current"])
+        self.assertEqual(len(data["results"]), 3)
+
+    def test_invalid_cursor(self):
+        data = self.execute(self.query, {"after": "bm90IGEgY3Vyc29y"})
+        self.assertIn("invalid cursor", data["errors"][0]["message"])
+
+
+class QueryPlannerTest(ProductsQueryMixin, TestCase):
+    def setUp(self):
+        self.create_catalog()
+        buyer = User.objects.create_user(
+            "buyer@example.com", "password", first_name="a", last_name="b"
+        )
+        wish = Wish.objects.create(user=buyer)
+        for product in self.catalog:
+            image = ImageUpload.objects.create(image=f"images/{product.id}.png")
+            ProductImage.objects.create(product=product, image=image, is_cover=True)
+            ProductComment.objects.create(product=product, user=buyer, comment="ok")
+            Cart.objects.create(product=product, user=buyer)
+            wish.products.add(product)
+
+    def test_query_count_matrix(self):
+        matrix = [
+            ("results { name price }", 1),
+            ("results { name category { name } business { name user { email } } }", 1),
+            ("results { name productImages { isCover image { id } } }", 2),
+            ("results { comments(first: 2) { results { comment user { email } } } }", 2),
+            ("results { productCarts { quantity } productsWished { id } }", 3),
+            ("results { category { productCategories { name productImages { id } } } }", 3),
+            ("size results { ...Fields }", 2),
+        ]
+        fragment = "fragment Fields on ProductType { name category { name } }"
+        for selection, expected in matrix:
+            query = "query { products(pageSize: 20) { %s } }" % selection
+            if "..." in selection:
+                query += fragment
+            with self.assertNumQueries(expected, msg=selection):
+                data = self.execute(query)
+            self.assertNotIn("errors", data, selection)
+            self.assertEqual(len(data["data"]["products"]["results"]), 11)
+
+    def test_only_selected_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.execute("query { products(pageSize: 20) { results { name } } }")
+        self.assertNotIn("description", ctx.captured_queries[0]["sql"])
+
+    def test_product_query_count(self):
+        query = """
+            query ($id: ID!) {
+                product(id: $id) {
+                    name business { name } productImages { image { id } }
+                    comments { results { rate } }
+                }
+            }
+        """
+        with self.assertNumQueries(3):
+            data = self.execute(query, {"id": self.catalog[0].id})
+        self.assertEqual(data["data"]["product"]["business"]["name"], "shop")
+        self.assertEqual(len(data["data"]["product"]["comments"]["results"]), 1)
+
+
+class ProductSearchMixin(ProductsQueryMixin):
+    query = """
+        query ($search: String, $sortBy: String) {
+            products(search: $search, sortBy: $sortBy, pageSize: 20) {
+                results { name }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.create_catalog()
+        Product.objects.filter(pk=self.catalog[0].pk).update(
+            name="red phone case", description="fits every phone"
+        )
+        Product.objects.filter(pk=self.catalog[1].pk).update(
+            name="blue lamp", description="a lamp for the red phone table"
+        )
+        for product in self.catalog[:2]:
+            product.refresh_from_db()
+            product.save()
+
+    def search(self, search, sort_by=None):
+        data = self.execute(self.query, {"search": search, "sortBy": sort_by})
+        self.assertNotIn("errors", data)
+        return [row["name"] for row in data["data"]["products"]["results"]]
+
+    def test_every_term_must_match(self):
+        self.assertEqual(set(self.search("phone red")), {"red phone case", "blue lamp"})
+        self.assertEqual(self.search("phone lamp"), ["blue lamp"])
+        self.assertEqual(self.search("lam"), ["blue lamp"])
+
+    def test_quoted_phrase(self):
+        self.assertEqual(self.search('"phone case"'), ["red phone case"])
+        self.assertEqual(self.search('"case phone"'), [])
+
+
+class ProductSearchTest(ProductSearchMixin, TestCase):
+    @skipUnless(connection.vendor == "postgresql", "postgres full-text search")
+    def test_relevance_ranks_name_above_description(self):
+        self.assertEqual(
+            self.search("red phone", sort_by="relevance"), ["red phone case", "blue lamp"]
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "postgres full-text search")
+    def test_search_vector_follows_category_rename(self):
+        self.categories[0].name = "gadgets"
+        self.categories[0].save()
+        expected = {p.name for p in Product.objects.filter(category=self.categories[0])}
+        self.assertEqual(set(self.search("gadgets")), expected)
+        self.assertEqual(self.search("books"), [])
+
+
+@override_settings(PRODUCT_SEARCH_BACKEND="memory")
+class ProductIndexSearchTest(ProductSearchMixin, TestCase):
+    def setUp(self):
+        product_index.clear()
+        super().setUp()
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.search("lamp"), ["blue lamp"])
+
+        product = self.catalog[2]
+        product.name = "desk lamp"
+        product.save()
+        self.assertEqual(self.search("lamp"), ["desk lamp", "blue lamp"])
+
+        self.catalog[1].delete()
+        self.assertEqual(self.search("lamp"), ["desk lamp"])
+
+        self.categories[0].name = "gadgets"
+        self.categories[0].save()
+        with self.assertNumQueries(1):
+            names = self.search("gadgets")
+        self.assertEqual(len(names), 4)
+
+    def test_refresh_picks_up_other_writers(self):
+        self.search("lamp")
+        Product.objects.filter(pk=self.catalog[2].pk).update(
+            name="floor lamp", updated_at=timezone.now()
+        )
+        self.assertEqual(self.search("floor"), [])
+        product_index.synced_at -= timedelta(seconds=product_index.refresh_interval + 1)
+        self.assertEqual(self.search("floor"), ["floor lamp"])
+
+
+class InvertedIndexTest(TestCase):
+    def test_prefix_and_removal(self):
+        index = InvertedIndex()
+        index.bulk_load([(1, "Red phone", "case"), (2, "red lamp", "phone stand")])
+        index.add(3, "Phone-case", "")
+        self.assertEqual(index.search("pho"), {1, 2, 3})
+        self.assertEqual(index.search("red pho"), {1, 2})
+        self.assertEqual(index.search('"phone case"'), {1, 3})
+        self.assertEqual(index.search("missing"), set())
+
+        index.add(1, "blue lamp", "")
+        index.remove(2)
+        self.assertEqual(index.search("lamp"), {1})
+        self.assertEqual(index.search("red"), set())
+        self.assertEqual(len(index), 2)
+
+
+class CheckoutTest(ProductsQueryMixin, TestCase):
+    def setUp(self):
+        self.create_catalog()
+        self.buyer = User.objects.create_user(
+            "buyer@example.com", "password", first_name="a", last_name="b"
+        )
+
+    def fill_cart(self, products, quantity=2):
+        Cart.objects.bulk_create(
+            [Cart(user=self.buyer, product=p, quantity=quantity) for p in products]
+        )
+
+    def test_checkout_places_one_order_per_seller(self):
+        other = Business.objects.create(user=self.buyer, name="other shop")
+        Product.objects.filter(pk=self.catalog[2].pk).update(business=other)
+        self.fill_cart(self.catalog[:3])
+        self.assertTrue(product_service.complete_payment(self.buyer))
+
+        self.assertFalse(Cart.objects.filter(user=self.buyer).exists())
+        orders = Order.objects.filter(user=self.buyer).order_by("business_id")
+        self.assertEqual(
+            [(o.business_id, o.total_price, o.total_quantity, o.line_count) for o in orders],
+            [
+                (self.business.pk, 2 * (self.catalog[0].price + self.catalog[1].price), 4, 2),
+                (other.pk, 2 * self.catalog[2].price, 2, 1),
+            ],
+        )
+        lines = OrderLine.objects.filter(order__user=self.buyer).order_by("product_id")
+        self.assertEqual(
+            [(l.product_id, l.product_name, l.quantity, l.price, l.total_price) for l in lines],
+            [(p.pk, p.name, 2, p.price, 2 * p.price) for p in self.catalog[:3]],
+        )
+        self.assertEqual(
+            set(
+                Product.objects.filter(pk__in=[p.pk for p in self.catalog[:3]])
+                .values_list("total_availeble", flat=True)
+            ),
+            {8},
+        )
+
+    def test_query_count_does_not_grow_with_cart(self):
+        self.fill_cart(self.catalog[:2])
+        with CaptureQueriesContext(connection) as small:
+            product_service.complete_payment(self.buyer)
+        self.fill_cart(self.catalog[2:10])
+        with CaptureQueriesContext(connection) as large:
+            product_service.complete_payment(self.buyer)
+        self.assertEqual(len(small), len(large))
+
+    def test_short_stock_rolls_back(self):
+        Product.objects.filter(pk=self.catalog[1].pk).update(total_availeble=1)
+        self.fill_cart(self.catalog[:2])
+        with self.assertRaisesMessage(Exception, "not enough products available"):
+            product_service.complete_payment(self.buyer)
+
+        self.assertEqual(Cart.objects.filter(user=self.buyer).count(), 2)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.catalog[0].pk).total_availeble, 10)
+
+
+@skipUnless(connection.vendor == "postgresql", "row locks need postgres")
+class CheckoutConcurrencyTest(ProductsQueryMixin, TransactionTestCase):
+    buyers = 8
+    stock = 3
+
+    def setUp(self):
+        self.create_catalog()
+        self.product = self.catalog[0]
+        Product.objects.filter(pk=self.product.pk).update(total_availeble=self.stock)
+        self.users = [
+            User.objects.create_user(
+                f"buyer{i}@example.com", "password", first_name="a", last_name="b"
+            )
+            for i in range(self.buyers)
+        ]
+        for user in self.users:
+            # the contended product is locked in the middle of every cart
+            Cart.objects.create(user=user, product=self.catalog[2])
+            Cart.objects.create(user=user, product=self.product)
+            Cart.objects.create(user=user, product=self.catalog[1])
+
+    def test_last_units_are_sold_once(self):
+        barrier = threading.Barrier(self.buyers)
+        results = {}
+
+        def checkout(user):
+            try:
+                barrier.wait()
+                results[user.pk] = product_service.complete_payment(user)
+            except Exception as e:
+                results[user.pk] = e
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(u,)) for u in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        winners = [pk for pk, result in results.items() if result is True]
+        self.assertEqual(len(winners), self.stock)
+        for pk, result in results.items():
+            if result is not True:
+                self.assertIn("not enough products available", str(result))
+                self.assertEqual(Cart.objects.filter(user_id=pk).count(), 3)
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).total_availeble, 0)
+        self.assertEqual(
+            Product.objects.get(pk=self.catalog[1].pk).total_availeble, 10 - self.stock
+        )
+        self.assertEqual(
+            set(Order.objects.values_list("user_id", flat=True)), set(winners)
+        )
+        self.assertEqual(OrderLine.objects.count(), 3 * self.stock)
+
+
+class ReservationTest(ProductsQueryMixin, TestCase):
+    def setUp(self):
+        self.create_catalog()
+        self.product = self.catalog[0]
+        self.buyers = [
+            User.objects.create_user(
+                f"buyer{i}@example.com", "password", first_name="a", last_name="b"
+            )
+            for i in range(2)
+        ]
+
+    def available(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(
+                "query ($id: ID!) { product(id: $id) { available } }",
+                {"id": self.product.pk},
+            )
+        self.assertNotIn("search_vector", queries[-1]["sql"])
+        return data["data"]["product"]["available"]
+
+    def test_cart_lines_hold_stock(self):
+        cart = product_service.create_cart(self.product.pk, self.buyers[0], 6)
+        self.assertEqual(self.available(), 4)
+
+        with self.assertRaisesMessage(Exception, "not enough products available"):
+            product_service.create_cart(self.product.pk, self.buyers[1], 5)
+        self.assertFalse(Cart.objects.filter(user=self.buyers[1]).exists())
+
+        product_service.update_cart(cart.pk, self.buyers[0], 2)
+        self.assertEqual(self.available(), 8)
+        product_service.create_cart(self.product.pk, self.buyers[1], 5)
+        self.assertEqual(self.available(), 3)
+
+        product_service.delete_cart(cart.pk)
+        self.assertEqual(self.available(), 5)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_checkout_converts_holds(self):
+        product_service.create_cart(self.product.pk, self.buyers[0], 6)
+        product_service.create_cart(self.product.pk, self.buyers[1], 4)
+        # an expired hold the reaper hasn't released yet is still converted
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        product_service.complete_payment(self.buyers[0])
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.total_availeble, product.total_reserved), (4, 4))
+        self.assertEqual(self.available(), 0)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_reaper_releases_expired_holds_in_batches(self):
+        for i, product in enumerate(self.catalog[:5]):
+            product_service.create_cart(product.pk, self.buyers[0], i + 1)
+        product_service.create_cart(self.product.pk, self.buyers[1], 3)
+        later = timezone.now() + reservation_service.get_ttl()
+        Reservation.objects.filter(cart__user=self.buyers[1]).update(
+            expires_at=later + timedelta(minutes=1)
+        )
+        # holds outlive their carts until they expire
+        self.buyers[0].delete()
+        self.assertEqual(Reservation.objects.filter(cart=None).count(), 5)
+
+        self.assertEqual(reservation_service.reap_expired(batch_size=2), 0)
+        self.assertEqual(
+            reservation_service.reap_expired(batch_size=2, now=later + timedelta(seconds=1)),
+            5,
+        )
+        self.assertEqual(
+            list(Product.objects.order_by("pk").values_list("total_reserved", flat=True)),
+            [3] + [0] * 10,
+        )
+        self.assertEqual(Reservation.objects.get().cart.user, self.buyers[1])
+
+
+class OrderQueryTest(ProductsQueryMixin, TestCase):
+    query = """
+        query ($after: String) {
+            %s(pageSize: 2, after: $after) {
+                hasNext
+                after
+                results {
+                    totalPrice
+                    lineCount
+                    business { name }
+                    orderLines { productName quantity }
+                }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.create_catalog()
+        self.buyer = User.objects.create_user(
+            "buyer@example.com", "password", first_name="a", last_name="b"
+        )
+        for product in self.catalog[:5]:
+            Cart.objects.create(user=self.buyer, product=product, quantity=1)
+            product_service.complete_payment(self.buyer)
+
+    def auth(self, user):
+        return f"JWT {TokenManager.get_access({'user_id': user.id})}"
+
+    def test_buyer_and_seller_pages(self):
+        for field, user in (("orders", self.buyer), ("businessOrders", self.business.user)):
+            # authenticates and warms the user cache
+            self.execute(self.query % field, HTTP_AUTHORIZATION=self.auth(user))
+            names, after = [], None
+            while True:
+                with self.assertNumQueries(2):
+                    data = self.execute(
+                        self.query % field,
+                        {"after": after},
+                        HTTP_AUTHORIZATION=self.auth(user),
+                    )
+                page = data["data"][field]
+                names += [o["orderLines"][0]["productName"] for o in page["results"]]
+                self.assertTrue(all(o["lineCount"] == 1 for o in page["results"]))
+                if not page["hasNext"]:
+                    break
+                after = page["after"]
+            self.assertEqual(names, [p.name for p in reversed(self.catalog[:5])])
+
+    def test_orders_need_a_user(self):
+        data = self.execute(self.query % "orders")
+        self.assertIn("not authorized", data["errors"][0]["message"])
+
+
+class ProductRatingTest(ProductsQueryMixin, TestCase):
+    def setUp(self):
+        self.create_catalog()
+        self.buyers = [
+            User.objects.create_user(
+                f"buyer{i}@example.com", "password", first_name="a", last_name="b"
+            )
+            for i in range(3)
+        ]
+
+    def rate(self, product, *rates):
+        return [
+            product_service.create_product_comment(product.pk, "ok", buyer, rate)
+            for buyer, rate in zip(self.buyers, rates)
+        ]
+
+    def rating(self, product):
+        product = Product.objects.get(pk=product.pk)
+        return round(product.rating_avg, 6), product.rating_count
+
+    def test_comments_keep_aggregates(self):
+        comments = self.rate(self.catalog[0], 5, 4, 1)
+        self.assertEqual(self.rating(self.catalog[0]), (3.333333, 3))
+
+        comments[2].delete()
+        self.assertEqual(self.rating(self.catalog[0]), (4.5, 2))
+        ProductComment.objects.filter(pk__in=[c.pk for c in comments[:2]]).delete()
+        self.assertEqual(self.rating(self.catalog[0]), (0, 0))
+
+        with self.assertRaisesMessage(Exception, "you cannot comment your products"):
+            product_service.create_product_comment(
+                self.catalog[1].pk, "mine", self.business.user, 5
+            )
+
+    def test_reconcile_fixes_drift(self):
+        self.rate(self.catalog[0], 5, 4)
+        self.rate(self.catalog[1], 2)
+        Product.objects.filter(pk=self.catalog[0].pk).update(rating_count=7)
+        Product.objects.filter(pk=self.catalog[2].pk).update(rating_avg=3, rating_count=1)
+
+        self.assertEqual(rating_service.reconcile_ratings(batch_size=4), 2)
+        self.assertEqual(self.rating(self.catalog[0]), (4.5, 2))
+        self.assertEqual(self.rating(self.catalog[1]), (2, 1))
+        self.assertEqual(self.rating(self.catalog[2]), (0, 0))
+        self.assertEqual(rating_service.reconcile_ratings(batch_size=4), 0)
+
+    def test_sort_by_rating(self):
+        self.rate(self.catalog[3], 2)
+        self.rate(self.catalog[5], 5, 4)
+        self.rate(self.catalog[7], 5)
+        data = self.execute(
+            """{ products(sortBy: "rating", pageSize: 3) {
+                results { id ratingAvg ratingCount }
+            } }"""
+        )
+        self.assertEqual(
+            data["data"]["products"]["results"],
+            [
+                {"id": str(self.catalog[7].pk), "ratingAvg": 5.0, "ratingCount": 1},
+                {"id": str(self.catalog[5].pk), "ratingAvg": 4.5, "ratingCount": 2},
+                {"id": str(self.catalog[3].pk), "ratingAvg": 2.0, "ratingCount": 1},
+            ],
+        )
+
+
+class ProductCommentsTest(ProductsQueryMixin, TestCase):
+    query = """
+        query ($first: Int, $after: String, $order: String) {
+            products(pageSize: 3, sortBy: "price", isAsc: true) {
+                results {
+                    id
+                    comments(first: $first, after: $after, order: $order) {
+                        hasNext
+                        after
+                        results { comment }
+                    }
+                }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.create_catalog()
+        users = [
+            User.objects.create_user(
+                f"buyer{i}@example.com", "password", first_name="a", last_name="b"
+            )
+            for i in range(5)
+        ]
+        start = timezone.now()
+        for product in self.catalog:
+            ProductComment.objects.bulk_create(
+                [
+                    ProductComment(product=product, user=user, comment=f"{product.pk}-{i}")
+                    for i, user in enumerate(users)
+                ]
+            )
+        # distinct timestamps, bulk_create stamps them all within microseconds
+        for i, comment in enumerate(ProductComment.objects.order_by("pk")):
+            ProductComment.objects.filter(pk=comment.pk).update(
+                created_at=start + timedelta(seconds=i)
+            )
+
+    def comments(self, **variables):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(self.query, variables)
+        self.assertNotIn("errors", data)
+        return data["data"]["products"]["results"], queries
+
+    def test_first_pages_are_one_query(self):
+        products, queries = self.comments(first=2)
+        self.assertEqual(len(queries), 2)
+        # bounded per product, by LIMIT or ROW_NUMBER() depending on the backend
+        self.assertRegex(queries[1]["sql"], r"LIMIT 3|ROW_NUMBER\(\)")
+        for product in products:
+            self.assertTrue(product["comments"]["hasNext"])
+            self.assertEqual(
+                [c["comment"] for c in product["comments"]["results"]],
+                [f"{product['id']}-4", f"{product['id']}-3"],
+            )
+
+    def test_cursor_walk(self):
+        query = """
+            query ($id: ID!, $after: String) {
+                product(id: $id) {
+                    comments(first: 2, after: $after, order: "oldest") {
+                        hasNext after results { comment }
+                    }
+                }
+            }
+        """
+        product = self.catalog[0]
+        seen, after = [], None
+        while True:
+            data = self.execute(query, {"id": product.pk, "after": after})
+            page = data["data"]["product"]["comments"]
+            seen += [c["comment"] for c in page["results"]]
+            if not page["hasNext"]:
+                break
+            after = page["after"]
+        self.assertEqual(seen, [f"{product.pk}-{i}" for i in range(5)])
+
+    def test_first_capped(self):
+        graphene = {**settings.GRAPHENE, "MAX_PAGE_SIZE": 3}
+        with override_settings(GRAPHENE=graphene):
+            products, queries = self.comments(first=100000000)
+        self.assertNotIn("100000000", queries[1]["sql"])
+        for product in products:
+            self.assertEqual(len(product["comments"]["results"]), 3)
+            self.assertTrue(product["comments"]["hasNext"])
+
+    def test_invalid_order(self):
+        data = self.execute(self.query, {"order": "random"})
+        self.assertIn("invalid comment order", data["errors"][0]["message"])
+
+
+# invalidation runs on commit, which TestCase never reaches
+class CategoryListingTest(ProductsQueryMixin, TransactionTestCase):
+    query = """
+        query ($name: String) { categories(name: $name) { name productCount } }
+    """
+
+    def setUp(self):
+        category_cache.clear()
+        self.create_catalog()
+
+    def listing(self, name=None):
+        data = self.execute(self.query, {"name": name})
+        return [(c["name"], c["productCount"]) for c in data["data"]["categories"]]
+
+    def test_served_from_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.listing(), [("books", 4), ("phones", 4), ("toys", 3)])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.listing("PH"), [("phones", 4)])
+            self.assertEqual(self.listing("o"), self.listing())
+
+    def test_writes_invalidate(self):
+        self.listing()
+        product = self.catalog[0]
+        product.category = self.categories[2]
+        product.save()
+        self.assertEqual(self.listing(), [("books", 3), ("phones", 4), ("toys", 4)])
+
+        self.catalog[1].delete()
+        self.categories[2].name = "games"
+        self.categories[2].save()
+        self.assertEqual(self.listing(), [("books", 3), ("games", 4), ("phones", 3)])
+
+        Category.objects.create(name="art")
+        self.assertEqual(self.listing()[0], ("art", 0))
+
+    def test_reconcile_counts(self):
+        Category.objects.update(product_count=0)
+        self.assertEqual(category_service.reconcile_product_counts(), 3)
+        self.assertEqual(self.listing(), [("books", 4), ("phones", 4), ("toys", 3)])
+        self.assertEqual(category_service.reconcile_product_counts(), 0)
+
+
+class CategoryTreeTest(ProductsQueryMixin, TransactionTestCase):
+    query = """
+        query ($categoryId: ID, $category: String) {
+            products(categoryId: $categoryId, category: $category, pageSize: 20) {
+                results { id }
+            }
+        }
+    """
+
+    def setUp(self):
+        category_cache.clear()
+        self.create_catalog()
+        books, phones, toys = self.categories
+        # books > phones > toys
+        phones.parent = books
+        phones.save()
+        toys.parent = phones
+        toys.save()
+
+    def product_ids(self, **variables):
+        data = self.execute(self.query, variables)
+        return sorted(int(p["id"]) for p in data["data"]["products"]["results"])
+
+    def in_categories(self, *categories):
+        return sorted(p.pk for p in self.catalog if p.category in categories)
+
+    def test_paths(self):
+        books, phones, toys = self.categories
+        toys.refresh_from_db()
+        self.assertEqual(toys.path, f"{books.pk}/{phones.pk}/{toys.pk}/")
+
+        # moving a category carries its subtree
+        phones.parent = None
+        phones.save()
+        toys.refresh_from_db()
+        self.assertEqual(toys.path, f"{phones.pk}/{toys.pk}/")
+
+        books.parent = toys
+        books.save()
+        phones.parent = books
+        with self.assertRaises(Exception):
+            phones.save()
+
+    def test_products_of_subtree(self):
+        books, phones, toys = self.categories
+        self.product_ids()  # warm the category cache
+        with self.assertNumQueries(2):
+            self.assertEqual(
+                self.product_ids(categoryId=phones.pk), self.in_categories(phones, toys)
+            )
+        self.assertEqual(self.product_ids(categoryId=books.pk), self.in_categories(*self.categories))
+        self.assertEqual(self.product_ids(category="TOYS"), self.in_categories(toys))
+        self.assertEqual(self.product_ids(category="toy"), [])
+        self.assertEqual(self.product_ids(categoryId=0), [])
+
+
+class SeededCategoryTest(ProductsQueryMixin, TestCase):
+    query = """
+        query ($categoryId: ID) {
+            products(categoryId: $categoryId, pageSize: 100) { results { id } }
+        }
+    """
+
+    def setUp(self):
+        from benchmarks.seed import seed_catalog
+
+        category_cache.clear()
+        seed_catalog(products=60, categories=3, businesses=2)
+
+    def test_filter_stays_in_category(self):
+        for category in Category.objects.all():
+            self.assertEqual(category.path, f"{category.pk}/")
+            data = self.execute(self.query, {"categoryId": category.pk})
+            ids = [int(p["id"]) for p in data["data"]["products"]["results"]]
+            self.assertTrue(ids)
+            self.assertEqual(
+                set(Product.objects.filter(pk__in=ids).values_list("category_id", flat=True)),
+                {category.pk},
+            )
+
+    def test_empty_path_not_widened(self):
+        category = Category.objects.first()
+        Category.objects.filter(pk=category.pk).update(path="")
+        category_cache.clear()
+        self.assertEqual(category_service.get_subtree_ids(category.pk), [category.pk])
+
+
+class ProductFacetsTest(ProductsQueryMixin, TestCase):
+    query = """
+        query ($minPrice: Float, $after: String) {
+            products(minPrice: $minPrice, pageSize: 2, after: $after) {
+                results { id }
+                facets {
+                    categories { name count }
+                    businesses { name count }
+                    prices(bounds: [11, 12]) { min max count }
+                }
+            }
+        }
+    """
+
+    def setUp(self):
+        category_cache.clear()
+        self.create_catalog()
+
+    def facets(self, **variables):
+        data = self.execute(self.query, variables)
+        return data["data"]["products"]["facets"]
+
+    def test_counts_of_filtered_listing(self):
+        self.facets()  # warm the category cache
+        # page, one GROUP BY per facet and the business names
+        with self.assertNumQueries(5):
+            facets = self.facets(minPrice=11)
+        # prices are 10 + i % 3, categories i % 3
+        self.assertEqual(facets["categories"], [
+            {"name": "phones", "count": 4}, {"name": "toys", "count": 3}
+        ])
+        self.assertEqual(facets["businesses"], [{"name": "shop", "count": 7}])
+        self.assertEqual(facets["prices"], [
+            {"min": None, "max": 11.0, "count": 0},
+            {"min": 11.0, "max": 12.0, "count": 4},
+            {"min": 12.0, "max": None, "count": 3},
+        ])
+
+    def test_same_on_every_page(self):
+        data = self.execute(self.query, {"minPrice": 11})["data"]["products"]
+        cursor = self.execute(
+            "query { products(minPrice: 11, pageSize: 2) { after } }"
+        )["data"]["products"]["after"]
+        self.assertEqual(self.facets(minPrice=11, after=cursor), data["facets"])
+
+    def test_unfiltered_categories_from_kept_counts(self):
+        self.facets()
+        with self.assertNumQueries(0):
+            facets = facet_service.get_category_facets(product_service.get_products())
+        self.assertEqual([f["count"] for f in facets], [4, 4, 3])
+
+
+class ResponseCacheTest(ProductsQueryMixin, TransactionTestCase):
+    query = "query { products(pageSize: 3) { results { name } } }"
+
+    def setUp(self):
+        patcher = mock.patch.object(response_cache, "alias", "default")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        response_cache.clear()
+        category_cache.clear()
+        self.create_catalog()
+
+    def post(self, query, **headers):
+        response = self.client.post(
+            "/graphview/",
+            json.dumps({"query": query}),
+            content_type="application/json",
+            **headers,
+        )
+        return response.get("X-Response-Cache"), response.json()
+
+    def test_anonymous_query_served_from_cache(self):
+        status, data = self.post(self.query)
+        self.assertEqual(status, "MISS")
+        with self.assertNumQueries(0):
+            # same document, formatted differently
+            status, cached = self.post("{products(pageSize:3){results{name}}}")
+        self.assertEqual((status, cached), ("HIT", {"data": data["data"]}))
+        # the cost of the first execution is not replayed
+        self.assertIn("cost", data["extensions"])
+        self.assertEqual(response_cache.stats()["hits"], 1)
+
+    def test_bypassed(self):
+        token = TokenManager.get_access({"user_id": self.business.user_id})
+        for query, headers in (
+            (self.query, {"HTTP_AUTHORIZATION": f"JWT {token}"}),
+            ("query { products { results { productCarts { id } } } }", {}),
+            ("query { me { id } }", {}),
+            ("query { products { results { id } } users { results { id } } }", {}),
+            (
+                "query { products { results { business { user {"
+                " userWish { products { id } } } } } } }",
+                {},
+            ),
+        ):
+            self.assertIsNone(self.post(query, **headers)[0])
+        self.assertEqual(response_cache.stats()["bypasses"], 5)
+
+    def test_errors_not_stored(self):
+        query = 'query { products(after: "bad") { results { name } } }'
+        self.assertEqual(self.post(query)[0], "MISS")
+        self.assertEqual(self.post(query)[0], "MISS")
+        self.assertEqual(response_cache.stats()["stores"], 0)
+
+    def test_writes_invalidate(self):
+        self.post(self.query)
+        product = Product.objects.order_by("-created_at", "-pk").first()
+        product.name = "renamed"
+        product.save()
+        status, data = self.post(self.query)
+        self.assertEqual(status, "MISS")
+        self.assertEqual(data["data"]["products"]["results"][0]["name"], "renamed")
+
+        self.business.name = "other shop"
+        self.business.save()
+        self.assertEqual(self.post(self.query)[0], "MISS")
+        self.assertEqual(self.post(self.query)[0], "HIT")
+
+
+class SharedCacheCheckTest(TestCase):
+    def test_local_memory_refused(self):
+        from .checks import check_shared_caches
+
+        errors = check_shared_caches(None)
+        self.assertEqual(
+            [error.id for error in errors],
+            ["products.E001"] * len(errors),
+        )
+        self.assertIn("CATEGORY_CACHE uses the cache 'default'", errors[0].msg)
+
+        caches = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+                "LOCATION": "memcached:11211",
+            }
+        }
+        with override_settings(CACHES=caches):
+            self.assertEqual(check_shared_caches(None), [])
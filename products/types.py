@@ -1,5 +1,8 @@
 import graphene
 from graphene_django import DjangoObjectType
+from ecommerce_api.loaders import resolve_related
+from ecommerce_api.optimizer import optimize_queryset
+from ecommerce_api.pagination import Partition, paginate
 
 
 from .models import (
@@ -10,48 +13,143 @@ from .models import (
     ProductImage,
     Wish,
     Cart,
-    RequestCart,
+    Order,
+    OrderLine,
 )
+from .services import facet_service, product_service
 
 
 class CategoryType(DjangoObjectType):
     class Meta:
         model = Category
 
+    resolve_parent = resolve_related("parent")
+    resolve_children = resolve_related("children")
+    resolve_product_categories = resolve_related("product_categories")
+
 
 class BusinessType(DjangoObjectType):
     class Meta:
         model = Business
 
-
-class ProductType(DjangoObjectType):
-    class Meta:
-        model = Product
+    resolve_user = resolve_related("user")
+    resolve_business_products = resolve_related("business_products")
+    resolve_business_orders = resolve_related("business_orders")
 
 
 class ProductCommentType(DjangoObjectType):
     class Meta:
         model = ProductComment
 
+    resolve_product = resolve_related("product")
+    resolve_user = resolve_related("user")
+
+
+class ProductType(DjangoObjectType):
+    class Meta:
+        model = Product
+        # comments only through the paginated `comments` field
+        exclude = ('search_vector', 'product_comments')
+
+    available = graphene.Int(description='units that can still be put in a cart')
+    comments = graphene.Field(
+        paginate(ProductCommentType, cursor=True),
+        first=graphene.Int(),
+        after=graphene.String(),
+        before=graphene.String(),
+        order=graphene.String(description='newest (default) or oldest'),
+    )
+
+    model_columns = {
+        'available': ('total_availeble', 'total_reserved'),
+        'comments': (),
+    }
+
+    def resolve_available(self, info):
+        return max(self.total_availeble - self.total_reserved, 0)
+
+    def resolve_comments(self, info, order=None):
+        # one query for the first pages of every product being resolved
+        qs = optimize_queryset(product_service.get_comments(order), info)
+        return Partition(qs, 'product_id', self.pk)
+
+    resolve_category = resolve_related("category")
+    resolve_business = resolve_related("business")
+    resolve_product_images = resolve_related("product_images")
+    resolve_products_wished = resolve_related("products_wished")
+    resolve_product_carts = resolve_related("product_carts")
+    resolve_product_order_lines = resolve_related("product_order_lines")
+
 
 class ProductImageType(DjangoObjectType):
     class Meta:
         model = ProductImage
 
+    resolve_product = resolve_related("product")
+    resolve_image = resolve_related("image")
+
 
 class WishType(DjangoObjectType):
     class Meta:
         model = Wish
 
+    resolve_user = resolve_related("user")
+    resolve_products = resolve_related("products")
+
 
 class CartType(DjangoObjectType):
     class Meta:
         model = Cart
 
+    resolve_product = resolve_related("product")
+    resolve_user = resolve_related("user")
+
 
-class RequestCartType(DjangoObjectType):
+class OrderType(DjangoObjectType):
     class Meta:
-        model = RequestCart
+        model = Order
+
+    resolve_user = resolve_related("user")
+    resolve_business = resolve_related("business")
+    resolve_order_lines = resolve_related("order_lines")
+
+
+class OrderLineType(DjangoObjectType):
+    class Meta:
+        model = OrderLine
+
+    resolve_order = resolve_related("order")
+    resolve_product = resolve_related("product")
+
+
+class FacetCountType(graphene.ObjectType):
+    id = graphene.ID()
+    name = graphene.String()
+    count = graphene.Int()
+
+
+class PriceBucketType(graphene.ObjectType):
+    min = graphene.Float(description='inclusive, empty for the first bucket')
+    max = graphene.Float(description='exclusive, empty for the last bucket')
+    count = graphene.Int()
+
+
+class ProductFacetsType(graphene.ObjectType):
+    """Counts over every product matching the listing filters, not one page."""
+
+    categories = graphene.List(FacetCountType)
+    businesses = graphene.List(FacetCountType)
+    prices = graphene.List(PriceBucketType, bounds=graphene.List(graphene.Float))
+
+    # the root is the filtered products queryset
+    def resolve_categories(root, info):
+        return facet_service.get_category_facets(root)
+
+    def resolve_businesses(root, info):
+        return facet_service.get_business_facets(root)
+
+    def resolve_prices(root, info, bounds=None):
+        return facet_service.get_price_facets(root, bounds)
 
 
 class ProductInput(graphene.InputObjectType):
@@ -64,4 +162,3 @@ class ProductInput(graphene.InputObjectType):
 class ProductImageInput(graphene.InputObjectType):
     image_id = graphene.ID(required=True)
     is_cover = graphene.Boolean()
-
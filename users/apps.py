@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 
 class UserControllerConfig(AppConfig):
-    name = 'user_controller'
+    name = 'users'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from ecommerce_api.auth import user_cache
+
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    # after commit, a request in between would cache the old row again
+    pk = instance.pk
+    transaction.on_commit(lambda: user_cache.invalidate(pk))
@@ -1,3 +1,87 @@
+import json
+
 from django.test import TestCase
 
-# Create your tests here.
+from products.models import Business, Category, Product, ProductComment, Wish
+
+from .models import User
+
+
+class DataLoaderTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="books")
+        self.users = []
+        for i in range(6):
+            user = User.objects.create_user(
+                f"user{i}@example.com", "password", first_name="a", last_name="b"
+            )
+            business = Business.objects.create(user=user, name=f"shop {i}")
+            product = Product.objects.create(
+                category=category,
+                business=business,
+                name=f"product {i}",
+                price=10,
+                total_availeble=1,
+                total_count=1,
+                description="",
+            )
+            self.users.append(user)
+        for user in self.users:
+            for product in Product.objects.exclude(business__user=user)[:3]:
+                ProductComment.objects.create(product=product, user=user, comment="ok")
+
+    def execute(self, query):
+        response = self.client.post(
+            "/graphview/", json.dumps({"query": query}), content_type="application/json"
+        )
+        data = response.json()
+        self.assertNotIn("errors", data)
+        return data["data"]
+
+    def test_nested_relations_are_batched(self):
+        query = """
+            query {
+                users(pageSize: %d) {
+                    results {
+                        userBusiness { name }
+                        userComments { product { name business { user { email } } } }
+                    }
+                }
+            }
+        """
+        # page, businesses, comments, products, businesses, users
+        with self.assertNumQueries(6):
+            small = self.execute(query % 2)
+        with self.assertNumQueries(6):
+            large = self.execute(query % 6)
+
+        self.assertEqual(len(small["users"]["results"]), 2)
+        results = large["users"]["results"]
+        self.assertEqual([len(row["userComments"]) for row in results], [3] * 6)
+        self.assertEqual(results[0]["userBusiness"]["name"], "shop 0")
+
+    def test_missing_reverse_one_to_one(self):
+        User.objects.create_user("nobiz@example.com", "password", first_name="a", last_name="b")
+        data = self.execute("query { users(pageSize: 10) { results { email userWish { id } } } }")
+        self.assertEqual(
+            [row["userWish"] for row in data["users"]["results"]], [None] * 7
+        )
+
+    def test_many_to_many_both_sides(self):
+        products = list(Product.objects.all())
+        for user in self.users[:3]:
+            Wish.objects.create(user=user).products.set(products[:2])
+
+        query = """
+            query {
+                users(pageSize: 6) {
+                    results { userWish { products { name productsWished { id } } } }
+                }
+            }
+        """
+        # page, wishes, wished products, wishes of those products
+        with self.assertNumQueries(4):
+            data = self.execute(query)
+        wishes = [row["userWish"] for row in data["users"]["results"]]
+        self.assertEqual([len(wish["products"]) for wish in wishes[:3]], [2, 2, 2])
+        self.assertEqual(len(wishes[0]["products"][0]["productsWished"]), 3)
@@ -1,6 +1,7 @@
 import graphene
 from django.conf import settings
 from graphene_django import DjangoObjectType
+from ecommerce_api.loaders import resolve_related
 
 from .models import User, ImageUpload, UserProfile, UserAddress
 
@@ -9,6 +10,13 @@ class UserType(DjangoObjectType):
     class Meta:
         model = User
 
+    resolve_user_business = resolve_related("user_business")
+    resolve_user_comments = resolve_related("user_comments")
+    resolve_user_wish = resolve_related("user_wish")
+    resolve_user_carts = resolve_related("user_carts")
+    resolve_user_orders = resolve_related("user_orders")
+    resolve_user_profile = resolve_related("user_profile")
+
 
 class ImageUploadType(DjangoObjectType):
     image = graphene.String()
@@ -23,16 +31,25 @@ class ImageUploadType(DjangoObjectType):
             )
         return None
 
+    resolve_product_image = resolve_related("product_image")
+    resolve_user_images = resolve_related("user_images")
+
 
 class UserProfileType(DjangoObjectType):
     class Meta:
         model = UserProfile
 
+    resolve_user = resolve_related("user")
+    resolve_profile_picture = resolve_related("profile_picture")
+    resolve_user_addresses = resolve_related("user_addresses")
+
 
 class UserAddressType(DjangoObjectType):
     class Meta:
         model = UserAddress
 
+    resolve_user_profile = resolve_related("user_profile")
+
 
 class UserProfileInput(graphene.InputObjectType):
     profile_picture = graphene.String()